@@ -11,23 +11,29 @@ Usage:
     python scripts/run_pipeline.py --steps scb taxonomy jobs process
 """
 
+from __future__ import annotations
+
 import logging
 import sys
 import argparse
-import pandas as pd
-from datetime import datetime
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
-from data_pipeline.ingestion.scb_ingestion import SCBIngestion, DEFAULT_SSYK_CODES
-from data_pipeline.ingestion.arbetsformedlingen_ingestion import ArbetsformedlingenIngestion
-from data_pipeline.ingestion.taxonomy_ingestion import TaxonomyIngestion
-from data_pipeline.ingestion.esco_ingestion import EscoIngestion
-from data_pipeline.processing.data_processor import DataProcessor
 from data_pipeline.utils.config import get_settings
 
+# pandas and the ingestion clients are imported inside the steps that need
+# them, so `--help` and partial runs skip their import cost.
+if TYPE_CHECKING:
+    import pandas as pd
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -40,6 +46,181 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=1)
+def _default_start_date(today: date) -> str:
+    """Start of the job ads window (two years back), cached per calendar day."""
+    return (today - timedelta(days=730)).strftime("%Y-%m-%dT00:00:00")
+
+
+SKILLS_CACHE_COLUMNS = ["ad_id", "sha1_text", "skills_json"]
+
+def _enrich_with_cache(af_client, jobs_raw: pd.DataFrame, cache_path: Path) -> pd.DataFrame:
+    """Enrich job ads with skills, reusing results cached by earlier runs.
+    
+    Ads are keyed on (ad_id, sha1 of description text), so an ad whose text
+    changed is enriched again. Only the cache misses are sent to the API.
+    
+    Args:
+        af_client: ArbetsformedlingenIngestion with enrichments enabled
+        jobs_raw: Raw job ads DataFrame
+        cache_path: Parquet file holding previously enriched ads
+        
+    Returns:
+        DataFrame with columns: ad_id, skill, skill_type, probability
+    """
+    import pandas as pd
+    
+    ad_ids = jobs_raw["id"].astype(str)
+    text_hashes = [
+        hashlib.sha1((text if isinstance(text, str) else "").encode()).hexdigest()
+        for text in jobs_raw["description_text"]
+    ]
+    ad_keys = pd.MultiIndex.from_arrays([ad_ids, text_hashes])
+    
+    if cache_path.exists():
+        cache = pd.read_parquet(cache_path)
+    else:
+        cache = pd.DataFrame(columns=SKILLS_CACHE_COLUMNS)
+    cache_keys = pd.MultiIndex.from_frame(cache[["ad_id", "sha1_text"]])
+    
+    is_cached = ad_keys.isin(cache_keys)
+    logger.info("Skills cache: %d hits, %d misses", is_cached.sum(), (~is_cached).sum())
+    
+    cached = cache[cache_keys.isin(ad_keys)]
+    cached_skills = pd.DataFrame(
+        [
+            (ad_id, skill["skill"], skill["skill_type"], skill["probability"])
+            for ad_id, skills_json in zip(cached["ad_id"], cached["skills_json"])
+            for skill in json.loads(skills_json)
+        ],
+        columns=["ad_id", "skill", "skill_type", "probability"],
+    )
+    
+    if is_cached.all():
+        return cached_skills
+    new_skills = af_client.enrich_ads_with_skills(jobs_raw[~is_cached])
+    
+    # Write back the union. Ads that were processed but yielded no skills are
+    # stored with an empty list, so they are not sent to the API again next
+    # run; ads whose request failed are left out and retried.
+    skills_by_id = {}
+    if not new_skills.empty:
+        skills_by_id = {
+            str(ad_id): group[["skill", "skill_type", "probability"]].to_json(orient="records")
+            for ad_id, group in new_skills.groupby("ad_id", sort=False)
+        }
+    enriched_ids = new_skills.attrs.get("enriched_ad_ids", frozenset(skills_by_id))
+    missed = ~is_cached & ad_ids.isin(enriched_ids | skills_by_id.keys()).to_numpy()
+    new_entries = pd.DataFrame({
+        "ad_id": ad_ids[missed].to_numpy(),
+        "sha1_text": pd.Index(text_hashes)[missed],
+        "skills_json": [skills_by_id.get(ad_id, "[]") for ad_id in ad_ids[missed]],
+    })
+    if not cache.empty:
+        new_entries = pd.concat([cache, new_entries], ignore_index=True)
+    new_entries = new_entries.drop_duplicates(subset=["ad_id"], keep="last")
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    new_entries.to_parquet(cache_path, index=False)
+    
+    if cached_skills.empty:
+        return new_skills
+    return pd.concat([cached_skills, new_skills], ignore_index=True)
+
+
+def _run_jobs_step(processor, ssyk_codes: list, max_job_ads: int):
+    """Fetch job ads from Arbetsförmedlingen and enrich them with skills.
+    
+    Args:
+        processor: DataProcessor providing the data directories
+        ssyk_codes: SSYK codes to fetch (default: from taxonomy, else default list)
+        max_job_ads: Maximum job ads per occupation to fetch
+        
+    Returns:
+        Tuple of (jobs_raw, skills_processed); skills_processed may be None
+    """
+    logger.info("\n" + "="*40)
+    logger.info("STEP 3: Fetching job ads from Arbetsförmedlingen")
+    logger.info("="*40)
+    
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from data_pipeline.ingestion.scb_ingestion import DEFAULT_SSYK_CODES
+    from data_pipeline.ingestion.arbetsformedlingen_ingestion import ArbetsformedlingenIngestion
+    
+    skills_processed = None
+    
+    with ArbetsformedlingenIngestion(enable_enrichments=True, raw_dir=processor.raw_dir) as af_client:
+        # determine ssyk codes to fetch
+        af_ssyk_codes = ssyk_codes
+        
+        # If no specific codes requested, try to load ALL from taxonomy
+        if not af_ssyk_codes:
+            taxonomy_file = processor.processed_dir / "taxonomy_enriched.parquet"
+            if taxonomy_file.exists():
+                logger.info("Loading SSYK codes from %s", taxonomy_file)
+                if "ssyk_code" in pq.read_schema(taxonomy_file).names:
+                    # Dedupe in Arrow and only convert the unique codes to Python.
+                    # SSYK codes are zero-padded text (e.g. 0110), so they sort as strings.
+                    ssyk_column = pq.read_table(taxonomy_file, columns=["ssyk_code"])["ssyk_code"]
+                    unique_codes = pc.unique(pc.cast(ssyk_column, pa.string())).drop_null()
+                    af_ssyk_codes = sorted(code for code in unique_codes.to_pylist() if code)
+                    logger.info("Found %d unique SSYK codes in taxonomy", len(af_ssyk_codes))
+            
+        # Fallback to default if still empty
+        if not af_ssyk_codes:
+            logger.warning("No taxonomy file found and no codes provided. Using default list.")
+            af_ssyk_codes = DEFAULT_SSYK_CODES
+
+        # Expand time window to ensure we get enough ads (last 2 years)
+        start_date = _default_start_date(date.today())
+        
+        jobs_raw_path = processor.raw_dir / "af_jobs_raw.parquet"
+        if len(af_ssyk_codes) * max_job_ads > af_client.MAX_TOTAL_ADS:
+            # Too many raw ads to hold at once (e.g. every taxonomy code);
+            # stream them to Parquet in batches and read back the columns
+            af_client.fetch_historical_ads_to_parquet(
+                jobs_raw_path,
+                ssyk_codes=af_ssyk_codes,
+                start_date=start_date,
+                max_results_per_occupation=max_job_ads,
+            )
+            jobs_raw = pq.read_table(jobs_raw_path).to_pandas()
+        else:
+            jobs_raw = af_client.fetch_historical_ads(
+                ssyk_codes=af_ssyk_codes,
+                start_date=start_date,
+                max_results_per_occupation=max_job_ads,
+            )
+            
+            # Save raw data
+            af_client.save_to_parquet(jobs_raw, jobs_raw_path)
+        
+        # Enrich with skills
+        if not jobs_raw.empty:
+            logger.info("Enriching job ads with skills (this may take a while)...")
+            # Enrichment only reads the ad id and text; skip the other columns
+            enrich_input = jobs_raw[["id", "description_text"]].astype(
+                {"description_text": "string[pyarrow]"}
+            )
+            skills_raw = _enrich_with_cache(
+                af_client,
+                enrich_input,
+                processor.raw_dir / ".cache" / "esco_skills.parquet",
+            )
+            
+            if not skills_raw.empty:
+                skills_processed = af_client.aggregate_skills(skills_raw, jobs_raw)
+                logger.info("Aggregated %d skill records", len(skills_processed))
+                
+                af_client.save_to_parquet(
+                    skills_raw,
+                    processor.raw_dir / "af_skills_raw.parquet"
+                )
+    logger.info("Fetched %d job ads", len(jobs_raw))
+    return jobs_raw, skills_processed
+
+
 def run_pipeline(
     steps: list,
     local_only: bool = True,
@@ -58,9 +239,11 @@ def run_pipeline(
     """
     logger.info("="*60)
     logger.info("Starting Swedish Labor Market Data Pipeline")
-    logger.info(f"Steps to run: {steps}")
+    logger.info("Steps to run: %s", steps)
     logger.info("="*60)
     
+    from data_pipeline.processing.data_processor import DataProcessor
+    
     # Load settings
     settings = get_settings()
     processor = DataProcessor()
@@ -73,6 +256,7 @@ def run_pipeline(
     jobs_raw = None
     skills_processed = None
     taxonomy_path = None
+    jobs_future = None
     
     try:
         # ===== STEP 1: Fetch income data from SCB =====
@@ -81,6 +265,8 @@ def run_pipeline(
             logger.info("STEP 1: Fetching income data from SCB")
             logger.info("="*40)
             
+            from data_pipeline.ingestion.scb_ingestion import SCBIngestion
+            
             with SCBIngestion(api_key=settings.scb_api_key) as scb_client:
                 # 1. Regional Income
                 logger.info("Fetching regional income data...")
@@ -104,9 +290,9 @@ def run_pipeline(
                         dispersion_raw,
                         processor.raw_dir / "scb_dispersion_raw.parquet"
                     )
-                    logger.info(f"Fetched {len(dispersion_raw)} dispersion records")
+                    logger.info("Fetched %d dispersion records", len(dispersion_raw))
                 except Exception as e:
-                    logger.warning(f"Could not fetch dispersion data: {e}")
+                    logger.warning("Could not fetch dispersion data: %s", e)
                     
                 # 3. Income by Age
                 logger.info("Fetching income by age data...")
@@ -119,9 +305,9 @@ def run_pipeline(
                         age_raw,
                         processor.raw_dir / "scb_age_raw.parquet"
                     )
-                    logger.info(f"Fetched {len(age_raw)} age records")
+                    logger.info("Fetched %d age records", len(age_raw))
                 except Exception as e:
-                    logger.warning(f"Could not fetch age data: {e}")
+                    logger.warning("Could not fetch age data: %s", e)
 
                 # 4. Income by Education
                 logger.info("Fetching income by education data...")
@@ -134,11 +320,11 @@ def run_pipeline(
                         education_raw,
                         processor.raw_dir / "scb_education_raw.parquet"
                     )
-                    logger.info(f"Fetched {len(education_raw)} education records")
+                    logger.info("Fetched %d education records", len(education_raw))
                 except Exception as e:
-                    logger.warning(f"Could not fetch education data: {e}")
+                    logger.warning("Could not fetch education data: %s", e)
             
-            logger.info(f"Fetched {len(income_raw)} income records from SCB")
+            logger.info("Fetched %d income records from SCB", len(income_raw))
         
         # ===== STEP 2: Fetch Taxonomy Data =====
         if 'taxonomy' in steps:
@@ -146,9 +332,39 @@ def run_pipeline(
             logger.info("STEP 2: Fetching Taxonomy Data")
             logger.info("="*40)
             
+            from data_pipeline.ingestion.taxonomy_ingestion import TaxonomyIngestion
+            from data_pipeline.ingestion.esco_ingestion import EscoIngestion
+            
             try:
                 taxonomy_client = TaxonomyIngestion(raw_dir=processor.raw_dir)
-                taxonomy_client.fetch_files()
+                with taxonomy_client:
+                    taxonomy_client.fetch_files()
+                
+                # Step 3 only needs the SSYK codes, so start fetching job ads
+                # while the taxonomy is processed and enriched with ESCO. The
+                # codes are resolved here, so the worker never reads the
+                # taxonomy file this thread is about to write.
+                if 'jobs' in steps:
+                    from data_pipeline.ingestion.scb_ingestion import DEFAULT_SSYK_CODES
+                    
+                    jobs_ssyk_codes = ssyk_codes
+                    if not jobs_ssyk_codes:
+                        try:
+                            jobs_ssyk_codes = taxonomy_client.get_ssyk_codes_only()
+                        except Exception as e:
+                            logger.warning("Could not read SSYK codes from taxonomy: %s", e)
+                    if not jobs_ssyk_codes:
+                        logger.warning("No SSYK codes in taxonomy. Using default list.")
+                        jobs_ssyk_codes = DEFAULT_SSYK_CODES
+                    
+                    jobs_executor = ThreadPoolExecutor(max_workers=1)
+                    jobs_future = jobs_executor.submit(
+                        _run_jobs_step,
+                        processor,
+                        jobs_ssyk_codes,
+                        max_job_ads,
+                    )
+                
                 taxonomy_processed = taxonomy_client.process_taxonomy()
                 
                 # Enrichen with ESCO if requested or by default if taxonomy is run
@@ -163,62 +379,15 @@ def run_pipeline(
                         processor.processed_dir
                     )
             except Exception as e:
-                logger.warning(f"Taxonomy step failed: {e}")
+                logger.warning("Taxonomy step failed: %s", e)
 
         # ===== STEP 3: Fetch job ads from Arbetsförmedlingen =====
         if 'jobs' in steps:
-            logger.info("\n" + "="*40)
-            logger.info("STEP 3: Fetching job ads from Arbetsförmedlingen")
-            logger.info("="*40)
-            
-            with ArbetsformedlingenIngestion(enable_enrichments=True) as af_client:
-                # determine ssyk codes to fetch
-                af_ssyk_codes = ssyk_codes
-                
-                # If no specific codes requested, try to load ALL from taxonomy
-                if not af_ssyk_codes:
-                    taxonomy_file = processor.processed_dir / "taxonomy_enriched.parquet"
-                    if taxonomy_file.exists():
-                        logger.info(f"Loading SSYK codes from {taxonomy_file}")
-                        tax_df = pd.read_parquet(taxonomy_file)
-                        if "ssyk_code" in tax_df.columns:
-                            af_ssyk_codes = sorted(tax_df["ssyk_code"].astype(str).unique().tolist())
-                            logger.info(f"Found {len(af_ssyk_codes)} unique SSYK codes in taxonomy")
-                    
-                # Fallback to default if still empty
-                if not af_ssyk_codes:
-                    logger.warning("No taxonomy file found and no codes provided. Using default list.")
-                    af_ssyk_codes = DEFAULT_SSYK_CODES
-
-                # Expand time window to ensure we get enough ads (last 2 years)
-                start_date = (datetime.now() - pd.Timedelta(days=365*2)).strftime("%Y-%m-%dT00:00:00")
-                
-                jobs_raw = af_client.fetch_historical_ads(
-                    ssyk_codes=af_ssyk_codes,
-                    start_date=start_date,
-                    max_results_per_occupation=max_job_ads,
-                )
-                
-                # Save raw data
-                af_client.save_to_parquet(
-                    jobs_raw,
-                    processor.raw_dir / "af_jobs_raw.parquet"
-                )
-                
-                # Enrich with skills
-                if not jobs_raw.empty:
-                    logger.info("Enriching job ads with skills (this may take a while)...")
-                    skills_raw = af_client.enrich_ads_with_skills(jobs_raw)
-                    
-                    if not skills_raw.empty:
-                        skills_processed = af_client.aggregate_skills(skills_raw, jobs_raw)
-                        logger.info(f"Aggregated {len(skills_processed)} skill records")
-                        
-                        af_client.save_to_parquet(
-                            skills_raw,
-                            processor.raw_dir / "af_skills_raw.parquet"
-                        )
-            logger.info(f"Fetched {len(jobs_raw)} job ads")
+            if jobs_future is not None:
+                jobs_raw, skills_processed = jobs_future.result()
+                jobs_executor.shutdown()
+            else:
+                jobs_raw, skills_processed = _run_jobs_step(processor, ssyk_codes, max_job_ads)
         
         # ===== STEP 4: Process data =====
         if 'process' in steps:
@@ -226,6 +395,8 @@ def run_pipeline(
             logger.info("STEP 4: Processing data")
             logger.info("="*40)
             
+            import pandas as pd
+            
             # Load raw data if missing (skipped steps)
             if income_raw is None:
                 p = processor.raw_dir / "scb_income_raw.parquet"
@@ -243,16 +414,16 @@ def run_pipeline(
             income_processed = pd.DataFrame()
             if income_raw is not None:
                 income_processed = processor.process_income_data(income_raw)
-                logger.info(f"Processed income data: {len(income_processed)} records")
+                logger.info("Processed income data: %d records", len(income_processed))
             
             # Process job ads
             jobs_processed = pd.DataFrame()
             jobs_aggregated = pd.DataFrame()
             if jobs_raw is not None:
                 jobs_processed = processor.process_jobs_data(jobs_raw)
-                logger.info(f"Processed jobs data: {len(jobs_processed)} records")
+                logger.info("Processed jobs data: %d records", len(jobs_processed))
                 jobs_aggregated = processor.aggregate_jobs_by_region(jobs_processed, period="year")
-                logger.info(f"Aggregated jobs data: {len(jobs_aggregated)} records")
+                logger.info("Aggregated jobs data: %d records", len(jobs_aggregated))
             
             # Process dispersion
             dispersion_processed = None
@@ -297,13 +468,13 @@ def run_pipeline(
 
             
             for name, path in paths.items():
-                logger.info(f"  Saved {name}: {path}")
+                logger.info("  Saved %s: %s", name, path)
                 
             # Create summary stats
-            stats = processor.create_summary_stats(income_processed, jobs_processed)
-            logger.info(f"\nSummary Statistics:")
-            logger.info(f"  Income records: {stats['income'].get('record_count', 0)}")
-            logger.info(f"  Job ads: {stats['jobs'].get('total_ads', 0)}")
+            stats = processor.create_summary_stats(paths.get("income"), paths.get("jobs_detail"))
+            logger.info("\nSummary Statistics:")
+            logger.info("  Income records: %s", stats["income"].get("record_count", 0))
+            logger.info("  Job ads: %s", stats["jobs"].get("total_ads", 0))
         
         # ===== STEP 5: Upload =====
             if not local_only and settings.gcs_bucket_name:
@@ -313,19 +484,20 @@ def run_pipeline(
                 
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 
+                from data_pipeline.ingestion.scb_ingestion import SCBIngestion
+                
                 with SCBIngestion() as scb_client:
                     for name, path in paths.items():
-                        df = pd.read_parquet(path)
                         blob_name = f"processed/{name}_{timestamp}.parquet"
-                        scb_client.save_to_gcs(df, settings.gcs_bucket_name, blob_name)
-                        logger.info(f"  Uploaded {name} to gs://{settings.gcs_bucket_name}/{blob_name}")
+                        scb_client.save_file_to_gcs(path, settings.gcs_bucket_name, blob_name)
+                        logger.info("  Uploaded %s to gs://%s/%s", name, settings.gcs_bucket_name, blob_name)
         
         logger.info("\n" + "="*60)
         logger.info("Pipeline completed successfully!")
         logger.info("="*60)
         
     except Exception as e:
-        logger.error(f"\nPipeline failed: {e}", exc_info=True)
+        logger.error("\nPipeline failed: %s", e, exc_info=True)
         raise
 
 
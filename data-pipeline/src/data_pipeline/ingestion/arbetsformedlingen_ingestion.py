@@ -8,12 +8,31 @@ No API key required for these endpoints.
 """
 
 import httpx
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Optional, Generator
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Dict, List, Optional, Generator, Sequence, Tuple
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime, timedelta
 from pathlib import Path
-import time
+import io
 import logging
+import hashlib
+import queue
+import threading
+
+from data_pipeline.utils.cache import disk_cache
+from data_pipeline.utils.http_client import (
+    HostRateGate,
+    TokenBucket,
+    create_client,
+    read_json,
+    request_with_retry,
+)
+from data_pipeline.utils.parquet import PARQUET_ROW_GROUP_SIZE, PARQUET_WRITE_OPTIONS
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +59,82 @@ DEFAULT_SSYK_CODES = [
     "2173", "2143",  # Design and Electronics
 ]
 
+SKILL_COLUMNS = ["ad_id", "skill", "skill_type", "probability"]
+
+# Enrichment result key -> skill_type label
+SKILL_KEYS = (
+    ("competencies", "competency"),
+    ("traits", "trait"),  # soft skills
+    ("occupations", "occupation"),
+)
+
+# Output schema for flattened job ads
+AD_COLUMNS = [
+    "id", "headline", "ssyk_code", "occupation_label", "occupation_concept_id",
+    "employer_name", "employer_org_number",
+    "region", "region_code", "municipality", "municipality_code", "latitude", "longitude",
+    "published_date", "last_application_date", "number_of_vacancies",
+    "employment_type", "duration", "working_hours_type", "remote_work",
+    "description_text", "description_length",
+]
+
+# Description text is truncated at ingestion to what the enrichment API reads
+MAX_DESCRIPTION_LENGTH = 10000
+
+# Free-text columns held as Arrow-backed strings; low-cardinality text such as
+# region goes straight to a categorical (CATEGORICAL_AD_COLUMNS) instead
+TEXT_AD_COLUMNS = ["headline", "description_text", "employer_name"]
+
+# Low-cardinality string columns held as categoricals (dictionary-encoded in Parquet)
+CATEGORICAL_AD_COLUMNS = [
+    "ssyk_code", "occupation_label", "occupation_concept_id",
+    "region", "region_code", "municipality", "municipality_code",
+    "employment_type", "working_hours_type", "duration",
+]
+
+# Fixed Arrow schema for ads written in batches; per-batch inference would
+# give all-null columns (and category dictionaries) conflicting types
+_AD_ARROW_TYPES = {
+    "latitude": pa.float64(),
+    "longitude": pa.float64(),
+    "published_date": pa.timestamp("us"),
+    "last_application_date": pa.timestamp("us"),
+    "number_of_vacancies": pa.uint32(),
+    "remote_work": pa.bool_(),
+    "description_length": pa.uint32(),
+}
+AD_ARROW_SCHEMA = pa.schema([
+    (
+        col,
+        pa.dictionary(pa.int32(), pa.string())
+        if col in CATEGORICAL_AD_COLUMNS
+        else _AD_ARROW_TYPES.get(col, pa.string()),
+    )
+    for col in AD_COLUMNS
+])
+
+# Flattened (json_normalize) ad field -> output column
+AD_FIELD_MAP = {
+    "id": "id",
+    "headline": "headline",
+    "occupation_label": "occupation_label",
+    "occupation_concept_id": "occupation_concept_id",
+    "employer_name": "employer_name",
+    "employer_organization_number": "employer_org_number",
+    "workplace_address_region": "region",
+    "workplace_address_region_code": "region_code",
+    "workplace_address_municipality": "municipality",
+    "workplace_address_municipality_code": "municipality_code",
+    "publication_date": "published_date",
+    "application_deadline": "last_application_date",
+    "number_of_vacancies": "number_of_vacancies",
+    "employment_type_label": "employment_type",
+    "duration_label": "duration",
+    "working_hours_type_label": "working_hours_type",
+    "remote_work": "remote_work",
+    "description_text": "description_text",
+}
+
 
 class TaxonomyClient:
     """Client for Arbetsförmedlingen Taxonomy API.
@@ -50,15 +145,31 @@ class TaxonomyClient:
     
     BASE_URL = "https://taxonomy.api.jobtechdev.se/v1/taxonomy"
     
-    def __init__(self):
-        self.client = httpx.Client(
-            headers={
-                "Accept": "application/json",
-                "User-Agent": "SwedishLaborMarketAnalytics/1.0",
-            },
-            timeout=30.0,
-        )
+    # Reference data is effectively static, so results are cached on disk
+    # under the raw data directory (default: data-pipeline/data/raw)
+    DEFAULT_RAW_DIR = Path(__file__).parent.parent.parent.parent / "data" / "raw"
+    
+    TIMEOUT = 30.0
+    
+    def __init__(
+        self,
+        client: Optional[httpx.Client] = None,
+        gate: Optional[HostRateGate] = None,
+        raw_dir: Optional[Path] = None,
+    ):
+        """Initialize the client.
+        
+        Args:
+            client: Shared HTTP client; a private one is created if omitted
+            gate: Per-host rate gate shared with the other JobTech clients
+            raw_dir: Raw data directory; lookups are cached in its .cache/taxonomy
+        """
+        self._owns_client = client is None
+        self.client = client or create_client()
+        self.gate = gate
+        self._cache_dir = Path(raw_dir or self.DEFAULT_RAW_DIR) / ".cache" / "taxonomy"
     
+    @disk_cache(ttl_days=30)
     def get_ssyk_codes(self) -> pd.DataFrame:
         """Fetch all SSYK occupation codes.
         
@@ -70,10 +181,10 @@ class TaxonomyClient:
             "type": "ssyk-level-1 ssyk-level-2 ssyk-level-3 ssyk-level-4"
         }
         
-        response = self.client.get(url, params=params)
+        response = request_with_retry(self.client, "GET", url, gate=self.gate, params=params, timeout=self.TIMEOUT)
         response.raise_for_status()
         
-        data = response.json()
+        data = read_json(response)
         
         records = []
         for item in data:
@@ -92,6 +203,15 @@ class TaxonomyClient:
         Returns:
             DataFrame with region codes and names
         """
+        try:
+            return self._fetch_regions()
+        except httpx.HTTPStatusError:
+            logger.warning("GraphQL failed, using fallback region list")
+            return self._fallback_regions()
+    
+    @disk_cache(ttl_days=30)
+    def _fetch_regions(self) -> pd.DataFrame:
+        """Fetch Swedish regions from the GraphQL endpoint."""
         # Use GraphQL to get regions
         url = f"{self.BASE_URL}/graphql"
         
@@ -108,13 +228,12 @@ class TaxonomyClient:
         }
         """
         
-        response = self.client.post(url, json={"query": query})
-        
-        if response.status_code != 200:
-            logger.warning("GraphQL failed, using fallback region list")
-            return self._fallback_regions()
+        response = request_with_retry(
+            self.client, "POST", url, gate=self.gate, json={"query": query}, timeout=self.TIMEOUT
+        )
+        response.raise_for_status()
         
-        data = response.json()
+        data = read_json(response)
         concepts = data.get("data", {}).get("concepts", [])
         
         records = []
@@ -135,7 +254,8 @@ class TaxonomyClient:
         ])
     
     def close(self):
-        self.client.close()
+        if self._owns_client:
+            self.client.close()
 
 
 class EnrichmentsClient:
@@ -147,27 +267,26 @@ class EnrichmentsClient:
     
     BASE_URL = "https://jobad-enrichments-api.jobtechdev.se"
     
-    # Rate limiting
-    MIN_REQUEST_INTERVAL = 0.5  # seconds between requests
+    # Rate limiting: 2 req/s on average with bursts of up to 10 per client;
+    # clients sharing a HostRateGate are also spaced per host
+    RATE_LIMIT_BURST = 10
+    RATE_LIMIT_PER_SECOND = 2.0
     BATCH_SIZE = 10  # Process 10 documents at a time
+    MAX_CONCURRENT_REQUESTS = 8  # Batches in flight at once
     
-    def __init__(self):
-        self._last_request_time = 0.0
-        self.client = httpx.Client(
-            headers={
-                "Accept": "application/json",
-                "Content-Type": "application/json",
-                "User-Agent": "SwedishLaborMarketAnalytics/1.0",
-            },
-            timeout=60.0,
-        )
+    TIMEOUT = 60.0
     
-    def _rate_limit(self):
-        """Enforce rate limiting between requests."""
-        elapsed = time.time() - self._last_request_time
-        if elapsed < self.MIN_REQUEST_INTERVAL:
-            time.sleep(self.MIN_REQUEST_INTERVAL - elapsed)
-        self._last_request_time = time.time()
+    def __init__(self, client: Optional[httpx.Client] = None, gate: Optional[HostRateGate] = None):
+        """Initialize the client.
+        
+        Args:
+            client: Shared HTTP client; a private one is created if omitted
+            gate: Per-host rate gate shared with the other JobTech clients
+        """
+        self._owns_client = client is None
+        self.client = client or create_client()
+        self.gate = gate
+        self._bucket = TokenBucket(capacity=self.RATE_LIMIT_BURST, refill_rate=self.RATE_LIMIT_PER_SECOND)
     
     def enrich_documents(
         self,
@@ -183,8 +302,6 @@ class EnrichmentsClient:
         Returns:
             List of enriched documents with extracted skills
         """
-        self._rate_limit()
-        
         url = f"{self.BASE_URL}/enrichtextdocumentsbinary"
         
         payload = {
@@ -195,11 +312,13 @@ class EnrichmentsClient:
         }
         
         try:
-            response = self.client.post(url, json=payload)
+            response = request_with_retry(
+                self.client, "POST", url, bucket=self._bucket, gate=self.gate, json=payload, timeout=self.TIMEOUT
+            )
             response.raise_for_status()
-            return response.json()
+            return read_json(response)
         except httpx.HTTPError as e:
-            logger.warning(f"Enrichment API error: {e}")
+            logger.warning("Enrichment API error: %s", e)
             return []
     
     def enrich_batch(
@@ -218,71 +337,68 @@ class EnrichmentsClient:
             threshold: Minimum probability for skill extraction
             
         Returns:
-            DataFrame with ad_id, skill, skill_type, and probability
+            DataFrame with ad_id, skill, skill_type, and probability. Its
+            ``attrs["enriched_ad_ids"]`` holds the ids of every ad that was
+            processed, including those without skills; ads in a failed
+            request are left out.
         """
         if ads_df.empty:
-            return pd.DataFrame(columns=["ad_id", "skill", "skill_type", "probability"])
+            return pd.DataFrame(columns=SKILL_COLUMNS)
         
         all_skills = []
+        returned_hashes = set()
         
-        # Process in batches
-        for i in range(0, len(ads_df), self.BATCH_SIZE):
-            batch = ads_df.iloc[i:i + self.BATCH_SIZE]
-            
-            # Prepare documents for API
-            documents = []
-            for _, row in batch.iterrows():
-                text = row.get(text_column, "")
-                if text and isinstance(text, str) and len(text.strip()) > 50:
-                    documents.append({
-                        "doc_id": str(row[id_column]),
-                        "doc_text": text[:10000],  # Limit text length
-                    })
-            
-            if not documents:
-                continue
-            
-            logger.info(f"Enriching batch {i // self.BATCH_SIZE + 1}, {len(documents)} documents")
-            
-            # Call API
-            results = self.enrich_documents(documents, threshold)
-            
-            # Parse results
-            for doc_result in results:
-                ad_id = doc_result.get("doc_id")
-                enrichments = doc_result.get("enriched_candidates", {})
-                
-                # Extract skills
-                for skill in enrichments.get("competencies", []):
-                    all_skills.append({
-                        "ad_id": ad_id,
-                        "skill": skill.get("term", ""),
-                        "skill_type": "competency",
-                        "probability": skill.get("prediction", 0),
-                    })
-                
-                # Extract traits (soft skills)
-                for trait in enrichments.get("traits", []):
-                    all_skills.append({
-                        "ad_id": ad_id,
-                        "skill": trait.get("term", ""),
-                        "skill_type": "trait",
-                        "probability": trait.get("prediction", 0),
-                    })
-                
-                # Extract occupation titles
-                for occupation in enrichments.get("occupations", []):
-                    all_skills.append({
-                        "ad_id": ad_id,
-                        "skill": occupation.get("term", ""),
-                        "skill_type": "occupation",
-                        "probability": occupation.get("prediction", 0),
-                    })
-        
-        return pd.DataFrame(all_skills)
+        # Prepare documents for API, skipping ads with too little text
+        # String columns (Arrow-backed after ingestion) keep their dtype; any
+        # other column only counts its real strings as text
+        texts = ads_df[text_column]
+        if not isinstance(texts.dtype, pd.StringDtype):
+            texts = texts.where([isinstance(text, str) for text in texts])
+        texts = texts.fillna("")
+        mask = texts.str.strip().str.len() > 50
+        texts = texts[mask]
+        ids = ads_df.loc[mask, id_column].astype(str)
+        
+        # Reposted ads often share a description; send each distinct text once,
+        # keyed by its hash, and fan the results back out to every ad
+        ad_ids_by_hash = defaultdict(list)
+        all_documents = []
+        for ad_id, text in zip(ids.to_numpy(), texts.to_numpy()):
+            text_hash = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+            if text_hash not in ad_ids_by_hash:
+                all_documents.append({"doc_id": text_hash, "doc_text": text})
+            ad_ids_by_hash[text_hash].append(ad_id)
+        
+        batches = [
+            all_documents[i:i + self.BATCH_SIZE]
+            for i in range(0, len(all_documents), self.BATCH_SIZE)
+        ]
+        logger.info("Enriching %s unique documents (%s ads) in %s batches", len(all_documents), len(ids), len(batches))
+        
+        # Keep several batches in flight (still paced by the token bucket) and
+        # parse each result while later requests are on the wire
+        with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_REQUESTS) as executor:
+            for results in executor.map(lambda documents: self.enrich_documents(documents, threshold), batches):
+                returned_hashes.update(doc_result.get("doc_id") for doc_result in results)
+                all_skills.extend(
+                    (ad_id, skill.get("term", ""), skill_type, skill.get("prediction", 0))
+                    for doc_result in results
+                    for key, skill_type in SKILL_KEYS
+                    for skill in doc_result.get("enriched_candidates", {}).get(key, [])
+                    for ad_id in ad_ids_by_hash.get(doc_result.get("doc_id"), [])
+                )
+        
+        skills = pd.DataFrame.from_records(all_skills, columns=SKILL_COLUMNS)
+        # Ads too short to send have no skills by definition
+        skipped_ids = ads_df.loc[~mask, id_column].astype(str)
+        skills.attrs["enriched_ad_ids"] = frozenset(skipped_ids).union(
+            ad_id for text_hash in returned_hashes for ad_id in ad_ids_by_hash.get(text_hash, [])
+        )
+        return skills
     
     def close(self):
-        self.client.close()
+        if self._owns_client:
+            self.client.close()
 
 
 class HistoricalAdsClient:
@@ -295,25 +411,41 @@ class HistoricalAdsClient:
     
     BASE_URL = "https://historical.api.jobtechdev.se"
     
-    # Rate limiting
-    MIN_REQUEST_INTERVAL = 0.5  # seconds between requests
-    
-    def __init__(self):
-        self._last_request_time = 0.0
-        self.client = httpx.Client(
-            headers={
-                "Accept": "application/json",
-                "User-Agent": "SwedishLaborMarketAnalytics/1.0",
-            },
-            timeout=300.0,  # Historical API can be slow
-        )
+    # Rate limiting: 2 req/s on average with bursts of up to 10 per client;
+    # clients sharing a HostRateGate are also spaced per host
+    RATE_LIMIT_BURST = 10
+    RATE_LIMIT_PER_SECOND = 2.0
+    
+    # Deepest offset the search API pages to cheaply; larger result sets are
+    # split into narrower publication-date windows instead
+    MAX_OFFSET = 2000
+    MIN_WINDOW = timedelta(hours=1)
+    
+    MAX_CONCURRENT_PAGES = 4  # Pages of one window fetched in parallel
+    # Search requests in flight at once across all of this client's threads
+    # (occupations x windows x pages can otherwise reach over a hundred)
+    MAX_IN_FLIGHT = 8
     
-    def _rate_limit(self):
-        """Enforce rate limiting between requests."""
-        elapsed = time.time() - self._last_request_time
-        if elapsed < self.MIN_REQUEST_INTERVAL:
-            time.sleep(self.MIN_REQUEST_INTERVAL - elapsed)
-        self._last_request_time = time.time()
+    TIMEOUT = 300.0  # Historical API can be slow
+    
+    def __init__(
+        self,
+        client: Optional[httpx.Client] = None,
+        gate: Optional[HostRateGate] = None,
+        max_in_flight: int = MAX_IN_FLIGHT,
+    ):
+        """Initialize the client.
+        
+        Args:
+            client: Shared HTTP client; a private one is created if omitted
+            gate: Per-host rate gate shared with the other JobTech clients
+            max_in_flight: Search requests this client sends at once
+        """
+        self._owns_client = client is None
+        self.client = client or create_client()
+        self.gate = gate
+        self._bucket = TokenBucket(capacity=self.RATE_LIMIT_BURST, refill_rate=self.RATE_LIMIT_PER_SECOND)
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
     
     def search(
         self,
@@ -337,8 +469,6 @@ class HistoricalAdsClient:
         Returns:
             API response as dictionary
         """
-        self._rate_limit()
-        
         params = {
             "offset": offset,
             "limit": min(limit, 100),
@@ -355,11 +485,14 @@ class HistoricalAdsClient:
         
         url = f"{self.BASE_URL}/search"
         
-        logger.debug(f"Requesting: {url} with params: {params}")
-        response = self.client.get(url, params=params)
+        logger.debug("Requesting: %s with params: %s", url, params)
+        with self._in_flight:
+            response = request_with_retry(
+                self.client, "GET", url, bucket=self._bucket, gate=self.gate, params=params, timeout=self.TIMEOUT
+            )
         response.raise_for_status()
         
-        return response.json()
+        return read_json(response)
     
     def fetch_ads_for_period(
         self,
@@ -379,42 +512,103 @@ class HistoricalAdsClient:
         Yields:
             Individual job ad dictionaries
         """
-        offset = 0
-        limit = 100
-        total_fetched = 0
+        fetched = 0
         
-        while total_fetched < max_results:
-            logger.info(f"Fetching ads offset={offset}, total={total_fetched}")
-            
-            result = self.search(
-                ssyk_code=ssyk_code,
-                published_after=start_date,
-                published_before=end_date,
-                offset=offset,
-                limit=limit,
-            )
-            
-            hits = result.get("hits", [])
+        for hit in self._fetch_window(ssyk_code, start_date, end_date, max_results):
+            yield hit
+            fetched += 1
             
-            if not hits:
-                break
+            if fetched >= max_results:
+                return
+    
+    def _fetch_window(
+        self,
+        ssyk_code: str,
+        start_date: str,
+        end_date: str,
+        max_results: int,
+    ) -> Generator[Dict, None, None]:
+        """Page through one publication-date window, splitting it when too deep.
+        
+        Windows where the caller wants more ads than MAX_OFFSET are halved
+        recursively so every page stays at a shallow offset. The later half is
+        fetched first so the most recent ads still come first. A window that
+        is already MIN_WINDOW wide is paged only up to MAX_OFFSET, and the ads
+        past it are logged as dropped.
+        
+        Args:
+            ssyk_code: SSYK occupation code
+            start_date: Window start (ISO format)
+            end_date: Window end (ISO format)
+            max_results: Maximum results the caller will read from this window
             
-            for hit in hits:
-                yield hit
-                total_fetched += 1
-                
-                if total_fetched >= max_results:
-                    return
+        Yields:
+            Individual job ad dictionaries
+        """
+        limit = 100
+        
+        result = self.search(
+            ssyk_code=ssyk_code,
+            published_after=start_date,
+            published_before=end_date,
+            offset=0,
+            limit=limit,
+        )
+        total_available = result.get("total", {}).get("value", 0)
+        wanted = min(total_available, max_results)
+        
+        if wanted > self.MAX_OFFSET:
+            start = datetime.fromisoformat(start_date)
+            end = datetime.fromisoformat(end_date)
             
-            offset += len(hits)
+            if end - start > self.MIN_WINDOW:
+                mid = (start + (end - start) / 2).isoformat(timespec="seconds")
+                logger.info("Splitting %s..%s (%s ads) at %s", start_date, end_date, total_available, mid)
+                yield from self._fetch_window(ssyk_code, mid, end_date, max_results)
+                yield from self._fetch_window(ssyk_code, start_date, mid, max_results)
+                return
             
-            # Check if we've reached the end
-            total_available = result.get("total", {}).get("value", 0)
-            if offset >= total_available:
-                break
+            # The last page starts at MAX_OFFSET; anything beyond it is out of reach
+            dropped = wanted - (self.MAX_OFFSET + limit)
+            if dropped > 0:
+                logger.warning(
+                    "Window %s..%s for SSYK %s has %s ads and cannot be split further; dropping %s",
+                    start_date, end_date, ssyk_code, total_available, dropped,
+                )
+        
+        yield from result.get("hits", [])
+        
+        # The total fixes every remaining page offset, so fetch them concurrently
+        offsets = range(limit, min(total_available, max_results, self.MAX_OFFSET + 1), limit)
+        if not offsets:
+            return
+        
+        logger.info("Fetching %s more pages, total=%s", len(offsets), total_available)
+        
+        executor = ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_PAGES)
+        try:
+            pages = executor.map(
+                lambda offset: self.search(
+                    ssyk_code=ssyk_code,
+                    published_after=start_date,
+                    published_before=end_date,
+                    offset=offset,
+                    limit=limit,
+                ),
+                offsets,
+            )
+            for page in pages:
+                hits = page.get("hits", [])
+                if not hits:
+                    break
+                yield from hits
+        finally:
+            # Don't fetch pages nobody will read if the consumer stops early
+            executor.shutdown(cancel_futures=True)
     
     def close(self):
-        self.client.close()
+        if self._owns_client:
+            self.client.close()
 
 
 class ArbetsformedlingenIngestion:
@@ -424,15 +618,27 @@ class ArbetsformedlingenIngestion:
     job market data collection including skills extraction.
     """
     
-    def __init__(self, enable_enrichments: bool = False):
+    MAX_CONCURRENT_OCCUPATIONS = 8  # SSYK codes fetched in parallel
+    MAX_CONCURRENT_WINDOWS = 4  # Monthly windows per occupation fetched in parallel
+    MAX_TOTAL_ADS = 1_000_000  # Worst-case ads fetch_historical_ads may hold in memory
+    MAX_QUEUED_BATCHES = 4  # Fetched batches waiting for the Parquet writer
+    MIN_REQUEST_INTERVAL = 0.1  # Seconds between requests to one host until it sends a RateLimit-Policy
+    
+    def __init__(self, enable_enrichments: bool = False, raw_dir: Optional[Path] = None):
         """Initialize ingestion clients.
         
         Args:
             enable_enrichments: Whether to enable skills extraction via Enrichments API
+            raw_dir: Raw data directory holding the taxonomy lookup cache
         """
-        self.historical_client = HistoricalAdsClient()
-        self.taxonomy_client = TaxonomyClient()
-        self.enrichments_client = EnrichmentsClient() if enable_enrichments else None
+        # One connection pool and one per-host gate for all three JobTech
+        # APIs, so taxonomy setup and ad fetching cannot together exceed a
+        # host's rate limit
+        self.client = create_client()
+        self.gate = HostRateGate(min_interval=self.MIN_REQUEST_INTERVAL)
+        self.historical_client = HistoricalAdsClient(self.client, self.gate)
+        self.taxonomy_client = TaxonomyClient(self.client, self.gate, raw_dir)
+        self.enrichments_client = EnrichmentsClient(self.client, self.gate) if enable_enrichments else None
     
     def fetch_historical_ads(
         self,
@@ -452,6 +658,166 @@ class ArbetsformedlingenIngestion:
         Returns:
             DataFrame with job advertisements
         """
+        ssyk_codes, start_date, end_date = self._resolve_fetch_args(ssyk_codes, start_date, end_date)
+        
+        if len(ssyk_codes) * max_results_per_occupation > self.MAX_TOTAL_ADS:
+            raise ValueError(
+                f"Up to {len(ssyk_codes) * max_results_per_occupation} ads would be held in memory "
+                f"(limit {self.MAX_TOTAL_ADS}); use fetch_historical_ads_to_parquet instead"
+            )
+        
+        logger.info("Fetching ads for SSYK codes: %s from %s to %s", ssyk_codes, start_date, end_date)
+        
+        # Occupations are independent, so fetch them concurrently; the shared
+        # token bucket still caps the overall request rate
+        with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_OCCUPATIONS) as executor:
+            futures = [
+                executor.submit(
+                    self._fetch_occupation_ads,
+                    ssyk_code,
+                    start_date,
+                    end_date,
+                    max_results_per_occupation,
+                )
+                for ssyk_code in ssyk_codes
+            ]
+            raw_ads = []
+            ad_ssyk_codes = []
+            for ssyk_code, future in zip(ssyk_codes, futures):
+                ads = future.result()
+                raw_ads.extend(ads)
+                ad_ssyk_codes.extend([ssyk_code] * len(ads))
+        
+        # One small integer code per ad instead of a repeated string; sorted
+        # categories keep sorts and groupbys on ssyk_code lexicographic
+        ad_ssyk_codes = pd.Categorical(ad_ssyk_codes, categories=sorted(set(ssyk_codes)))
+        df = self._ads_to_frame(raw_ads, ad_ssyk_codes)
+        logger.info("Fetched %s total job ads", len(df))
+        
+        return df
+    
+    def fetch_historical_ads_to_parquet(
+        self,
+        output_path: Path,
+        ssyk_codes: Optional[List[str]] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        max_results_per_occupation: int = 5000,
+        batch_size: int = 1000,
+    ) -> int:
+        """Fetch historical job ads straight into a Parquet file.
+        
+        Unlike fetch_historical_ads, ads are flattened and written in batches
+        as they arrive, so memory use stays flat for arbitrarily long periods.
+        
+        Args:
+            output_path: Parquet file to write
+            ssyk_codes: List of SSYK codes to fetch (default: DEFAULT_SSYK_CODES)
+            start_date: Start date ISO format (default: 4 months ago)
+            end_date: End date ISO format (default: today)
+            max_results_per_occupation: Max ads per occupation
+            batch_size: Ads buffered per written row group
+            
+        Returns:
+            Number of ads written
+        """
+        ssyk_codes, start_date, end_date = self._resolve_fetch_args(ssyk_codes, start_date, end_date)
+        
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        logger.info("Streaming ads for SSYK codes: %s from %s to %s to %s", ssyk_codes, start_date, end_date, output_path)
+        
+        # Fetching runs in a producer thread; the bounded queue makes it block
+        # whenever the writer falls behind, capping the batches held in memory
+        batches = queue.Queue(maxsize=self.MAX_QUEUED_BATCHES)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._produce_ad_batches,
+            args=(batches, stop, ssyk_codes, start_date, end_date, max_results_per_occupation, batch_size),
+            daemon=True,
+        )
+        producer.start()
+        
+        written = 0
+        try:
+            with pq.ParquetWriter(output_path, AD_ARROW_SCHEMA, **PARQUET_WRITE_OPTIONS) as writer:
+                while (item := batches.get()) is not None:
+                    if isinstance(item, Exception):
+                        raise item
+                    ssyk_code, raw_ads = item
+                    written += self._write_ads_batch(writer, raw_ads, ssyk_code)
+        finally:
+            stop.set()
+            producer.join()
+        
+        logger.info("Wrote %s job ads to %s", written, output_path)
+        return written
+    
+    def _produce_ad_batches(
+        self,
+        batches: queue.Queue,
+        stop: threading.Event,
+        ssyk_codes: List[str],
+        start_date: str,
+        end_date: str,
+        max_results: int,
+        batch_size: int,
+    ):
+        """Fetch ads and put (ssyk_code, raw_ads) batches on a bounded queue.
+        
+        Ads repeated within one occupation are dropped, as in
+        fetch_historical_ads; an ad listed under two occupations is kept for each.
+        Puts None when done, or the exception if fetching fails. Gives up as
+        soon as the consumer sets ``stop``.
+        """
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=1.0)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        try:
+            for ssyk_code in dict.fromkeys(ssyk_codes):
+                buffer = []
+                seen_ids = set()  # Window boundaries can return the same ad twice
+                ads = self.historical_client.fetch_ads_for_period(
+                    ssyk_code=ssyk_code,
+                    start_date=start_date,
+                    end_date=end_date,
+                    max_results=max_results,
+                )
+                for ad in ads:
+                    if ad.get("id") in seen_ids:
+                        continue
+                    seen_ids.add(ad.get("id"))
+                    buffer.append(ad)
+                    if len(buffer) >= batch_size:
+                        if not put((ssyk_code, buffer)):
+                            return
+                        buffer = []
+                if buffer and not put((ssyk_code, buffer)):
+                    return
+            put(None)
+        except Exception as e:
+            put(e)
+    
+    def _write_ads_batch(self, writer: pq.ParquetWriter, raw_ads: List[Dict], ssyk_code: str) -> int:
+        """Flatten a batch of raw ads and append it to an open Parquet writer."""
+        df = self._ads_to_frame(raw_ads, [ssyk_code] * len(raw_ads))
+        writer.write_table(self._to_arrow_table(df))
+        return len(df)
+    
+    def _resolve_fetch_args(
+        self,
+        ssyk_codes: Optional[List[str]],
+        start_date: Optional[str],
+        end_date: Optional[str],
+    ) -> Tuple[List[str], str, str]:
+        """Fill in default occupations and date range for a fetch."""
         if ssyk_codes is None:
             ssyk_codes = DEFAULT_SSYK_CODES  # All ICT and data science occupations
         
@@ -461,66 +827,146 @@ class ArbetsformedlingenIngestion:
             # Fetch last 4 months to ensure we get recent ads when limiting count
             start_date = (datetime.now() - timedelta(days=120)).strftime("%Y-%m-%dT00:00:00")
         
-        logger.info(f"Fetching ads for SSYK codes: {ssyk_codes} from {start_date} to {end_date}")
+        return ssyk_codes, start_date, end_date
+    
+    def _fetch_occupation_ads(
+        self,
+        ssyk_code: str,
+        start_date: str,
+        end_date: str,
+        max_results: int,
+    ) -> List[Dict]:
+        """Fetch raw ads for a single occupation, sharded by calendar month.
         
-        all_records = []
+        Monthly windows are fetched concurrently in waves, most recent first,
+        until max_results ads have been collected.
         
-        for ssyk_code in ssyk_codes:
-            logger.info(f"Fetching ads for SSYK {ssyk_code}")
+        Args:
+            ssyk_code: SSYK occupation code
+            start_date: Start date ISO format
+            end_date: End date ISO format
+            max_results: Max ads to fetch
             
-            for ad in self.historical_client.fetch_ads_for_period(
-                ssyk_code=ssyk_code,
-                start_date=start_date,
-                end_date=end_date,
-                max_results=max_results_per_occupation,
-            ):
-                record = self._transform_ad(ad, ssyk_code)
-                all_records.append(record)
-        
-        df = pd.DataFrame(all_records)
-        logger.info(f"Fetched {len(df)} total job ads")
+        Returns:
+            List of raw job ad dictionaries
+        """
+        logger.info("Fetching ads for SSYK %s", ssyk_code)
         
-        return df
+        windows = self._month_windows(start_date, end_date)
+        ads = []
+        seen_ids = set()  # Window boundaries can return the same ad twice
+        
+        with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_WINDOWS) as executor:
+            for i in range(0, len(windows), self.MAX_CONCURRENT_WINDOWS):
+                fetch_window = partial(self._fetch_window_ads, ssyk_code, max_results=max_results - len(ads))
+                for window_ads in executor.map(fetch_window, windows[i:i + self.MAX_CONCURRENT_WINDOWS]):
+                    for ad in window_ads:
+                        if ad.get("id") in seen_ids:
+                            continue
+                        seen_ids.add(ad.get("id"))
+                        ads.append(ad)
+                        
+                        if len(ads) >= max_results:
+                            return ads
+        
+        return ads
+    
+    def _fetch_window_ads(self, ssyk_code: str, window: Tuple[str, str], max_results: int) -> List[Dict]:
+        """Fetch raw ads for one occupation within a (start, end) date window."""
+        return list(self.historical_client.fetch_ads_for_period(
+            ssyk_code=ssyk_code,
+            start_date=window[0],
+            end_date=window[1],
+            max_results=max_results,
+        ))
     
-    def _transform_ad(self, ad: Dict, ssyk_code: str) -> Dict:
-        """Transform a job ad to a flat record.
+    @staticmethod
+    def _month_windows(start_date: str, end_date: str) -> List[Tuple[str, str]]:
+        """Split a date range into calendar-month windows, most recent first.
         
         Args:
-            ad: Raw job ad from API
-            ssyk_code: SSYK code for this ad
+            start_date: Start date ISO format
+            end_date: End date ISO format
             
         Returns:
-            Flat dictionary for DataFrame
+            List of (start, end) ISO timestamps
         """
-        workplace = ad.get("workplace_address", {}) or {}
-        employer = ad.get("employer", {}) or {}
-        occupation = ad.get("occupation", {}) or {}
-        description = ad.get("description", {}) or {}
+        end = datetime.fromisoformat(end_date)
+        window_start = datetime.fromisoformat(start_date)
+        windows = []
         
-        return {
-            "id": ad.get("id"),
-            "headline": ad.get("headline"),
-            "ssyk_code": ssyk_code,
-            "occupation_label": occupation.get("label"),
-            "occupation_concept_id": occupation.get("concept_id"),
-            "employer_name": employer.get("name"),
-            "employer_org_number": employer.get("organization_number"),
-            "region": workplace.get("region"),
-            "region_code": workplace.get("region_code"),
-            "municipality": workplace.get("municipality"),
-            "municipality_code": workplace.get("municipality_code"),
-            "latitude": workplace.get("coordinates", [None, None])[1] if workplace.get("coordinates") else None,
-            "longitude": workplace.get("coordinates", [None, None])[0] if workplace.get("coordinates") else None,
-            "published_date": ad.get("publication_date"),
-            "last_application_date": ad.get("application_deadline"),
-            "number_of_vacancies": ad.get("number_of_vacancies", 1),
-            "employment_type": ad.get("employment_type", {}).get("label") if ad.get("employment_type") else None,
-            "duration": ad.get("duration", {}).get("label") if ad.get("duration") else None,
-            "working_hours_type": ad.get("working_hours_type", {}).get("label") if ad.get("working_hours_type") else None,
-            "remote_work": ad.get("remote_work"),
-            "description_text": description.get("text", ""),
-            "description_length": len(description.get("text", "") or ""),
-        }
+        while window_start < end:
+            next_month = (window_start.replace(day=1) + timedelta(days=32)).replace(
+                day=1, hour=0, minute=0, second=0, microsecond=0
+            )
+            window_end = min(next_month, end)
+            windows.append((window_start.isoformat(timespec="seconds"), window_end.isoformat(timespec="seconds")))
+            window_start = window_end
+        
+        return windows[::-1]
+    
+    def _ads_to_frame(self, raw_ads: List[Dict], ssyk_codes: Sequence[str]) -> pd.DataFrame:
+        """Flatten raw job ads into a DataFrame in a single pass.
+        
+        Args:
+            raw_ads: Raw job ads from API
+            ssyk_codes: SSYK code for each ad, aligned with raw_ads
+            
+        Returns:
+            DataFrame with one flat row per ad
+        """
+        if not raw_ads:
+            return pd.DataFrame(columns=AD_COLUMNS)
+        
+        # Every mapped field is at most one level deep; skip flattening anything deeper
+        flat = pd.json_normalize(raw_ads, sep="_", max_level=1)
+        df = flat.reindex(columns=list(AD_FIELD_MAP)).rename(columns=AD_FIELD_MAP)
+        
+        df["ssyk_code"] = ssyk_codes
+        
+        # Coordinates are [longitude, latitude]; unpack every pair in one array
+        lon_lat = np.full((len(df), 2), np.nan)
+        coordinates = flat.get("workplace_address_coordinates")
+        if coordinates is not None:
+            mask = (coordinates.str.len() == 2).to_numpy()
+            if mask.any():
+                lon_lat[mask] = np.array(coordinates[mask].tolist(), dtype="float64")
+        df["longitude"] = lon_lat[:, 0]
+        df["latitude"] = lon_lat[:, 1]
+        
+        df["number_of_vacancies"] = df["number_of_vacancies"].fillna(1).astype("int64")
+        # Record the full length, but only keep the part enrichment will read
+        df = df.astype({col: pd.StringDtype("pyarrow") for col in TEXT_AD_COLUMNS})
+        description = df["description_text"].fillna("")
+        df["description_length"] = description.str.len().astype("uint32")
+        df["description_text"] = description.str.slice(0, MAX_DESCRIPTION_LENGTH)
+        
+        return self._optimize_dtypes(df[AD_COLUMNS])
+    
+    def _optimize_dtypes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Shrink job ad columns to compact dtypes.
+        
+        Low-cardinality strings become categoricals, counts are downcast to the
+        smallest unsigned integer type, and ISO date strings are parsed so
+        Parquet stores them as timestamps.
+        
+        Args:
+            df: DataFrame with job ads
+            
+        Returns:
+            DataFrame with optimized dtypes
+        """
+        df = df.astype({col: "category" for col in CATEGORICAL_AD_COLUMNS if col in df.columns})
+        
+        for col in ("number_of_vacancies", "description_length"):
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], downcast="unsigned")
+        
+        for col in ("published_date", "last_application_date"):
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], errors="coerce", format="ISO8601")
+        
+        return df
     
     def fetch_taxonomy_data(self) -> Dict[str, pd.DataFrame]:
         """Fetch reference data from Taxonomy API.
@@ -552,19 +998,19 @@ class ArbetsformedlingenIngestion:
         if df.empty:
             return df
         
-        # Convert to datetime
-        df = df.copy()
-        df["published_date"] = pd.to_datetime(df["published_date"])
-        df["period"] = df["published_date"].dt.to_period(period)
-        
-        # Aggregate
-        agg = df.groupby(["period", "ssyk_code", "region"]).agg({
-            "id": "count",
-            "number_of_vacancies": "sum",
-            "description_length": "mean",
-        }).reset_index()
+        # Group on the int64-backed Period values; only the aggregated rows
+        # are formatted as strings afterwards
+        periods = pd.to_datetime(df["published_date"]).dt.to_period(period)
         
-        agg.columns = ["period", "ssyk_code", "region", "ad_count", "total_vacancies", "avg_description_length"]
+        # Aggregate; observed=True keeps categorical keys from expanding into
+        # every (period, ssyk_code, region) combination
+        agg = df.assign(period=periods).groupby(
+            ["period", "ssyk_code", "region"], observed=True, as_index=False
+        ).agg(
+            ad_count=("id", "count"),
+            total_vacancies=("number_of_vacancies", "sum"),
+            avg_description_length=("description_length", "mean"),
+        )
         agg["period"] = agg["period"].astype(str)
         
         return agg
@@ -582,39 +1028,66 @@ class ArbetsformedlingenIngestion:
         filepath = Path(filepath)
         filepath.parent.mkdir(parents=True, exist_ok=True)
         
-        df.to_parquet(filepath, index=False, engine="pyarrow")
-        logger.info(f"Saved {len(df)} records to {filepath}")
+        pq.write_table(
+            self._to_arrow_table(df),
+            filepath,
+            row_group_size=PARQUET_ROW_GROUP_SIZE,
+            **PARQUET_WRITE_OPTIONS,
+        )
+        logger.info("Saved %d records to %s", len(df), filepath)
         
         return filepath
     
     def save_to_gcs(self, df: pd.DataFrame, bucket_name: str, blob_name: str):
         """Save DataFrame to Google Cloud Storage.
         
+        The Parquet file is built in memory and uploaded in chunks, with no
+        local copy.
+        
         Args:
             df: DataFrame to save
             bucket_name: GCS bucket name
             blob_name: Blob name/path in bucket
         """
         from google.cloud import storage
-        import tempfile
-        import os
         
-        logger.info(f"Saving data to GCS: gs://{bucket_name}/{blob_name}")
+        logger.info("Saving data to GCS: gs://%s/%s", bucket_name, blob_name)
         
-        with tempfile.NamedTemporaryFile(suffix=".parquet", delete=False) as f:
-            temp_file = f.name
+        buffer = io.BytesIO()
+        pq.write_table(
+            self._to_arrow_table(df),
+            buffer,
+            row_group_size=PARQUET_ROW_GROUP_SIZE,
+            **PARQUET_WRITE_OPTIONS,
+        )
+        buffer.seek(0)
         
-        try:
-            df.to_parquet(temp_file, index=False, engine="pyarrow")
-            
-            client = storage.Client()
-            bucket = client.bucket(bucket_name)
-            blob = bucket.blob(blob_name)
-            blob.upload_from_filename(temp_file)
+        client = storage.Client()
+        blob = client.bucket(bucket_name).blob(blob_name)
+        blob.chunk_size = 8 * 1024 * 1024  # Resumable upload in 8 MB chunks
+        blob.upload_from_file(
+            buffer,
+            size=buffer.getbuffer().nbytes,
+            content_type="application/octet-stream",
+        )
+        
+        logger.info("Successfully saved to GCS")
+    
+    def _to_arrow_table(self, df: pd.DataFrame) -> pa.Table:
+        """Convert a DataFrame to Arrow with compact, dictionary-encoded dtypes.
+        
+        Job ad frames get AD_ARROW_SCHEMA, so a file from save_to_parquet has
+        the same column types as one from fetch_historical_ads_to_parquet.
+        
+        Args:
+            df: DataFrame to convert
             
-            logger.info(f"Successfully saved to GCS")
-        finally:
-            os.unlink(temp_file)
+        Returns:
+            Arrow table without the pandas index
+        """
+        df = self._optimize_dtypes(df)
+        schema = AD_ARROW_SCHEMA if list(df.columns) == AD_COLUMNS else None
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
     
     def close(self):
         """Close all clients."""
@@ -622,6 +1095,7 @@ class ArbetsformedlingenIngestion:
         self.taxonomy_client.close()
         if self.enrichments_client:
             self.enrichments_client.close()
+        self.client.close()
     
     def enrich_ads_with_skills(
         self,
@@ -639,13 +1113,13 @@ class ArbetsformedlingenIngestion:
         """
         if self.enrichments_client is None:
             logger.warning("Enrichments client not enabled. Initialize with enable_enrichments=True")
-            return pd.DataFrame(columns=["ad_id", "skill", "skill_type", "probability"])
+            return pd.DataFrame(columns=SKILL_COLUMNS)
         
         if "description_text" not in ads_df.columns:
             logger.warning("No description_text column found in DataFrame")
-            return pd.DataFrame(columns=["ad_id", "skill", "skill_type", "probability"])
+            return pd.DataFrame(columns=SKILL_COLUMNS)
         
-        logger.info(f"Enriching {len(ads_df)} job ads with skills data")
+        logger.info("Enriching %d job ads with skills data", len(ads_df))
         return self.enrichments_client.enrich_batch(
             ads_df,
             text_column="description_text",
@@ -670,22 +1144,38 @@ class ArbetsformedlingenIngestion:
         if skills_df.empty or ads_df.empty:
             return pd.DataFrame()
         
-        # Join skills with ad occupation info
-        merged = skills_df.merge(
-            ads_df[["id", "ssyk_code", "occupation_label"]],
+        # Join skills with ad occupation info on categorical ids sharing one
+        # dictionary, so the join compares integer codes instead of strings
+        ad_ids = pd.concat([skills_df["ad_id"], ads_df["id"]]).dropna().unique()
+        merged = skills_df.assign(
+            ad_id=pd.Categorical(skills_df["ad_id"], categories=ad_ids)
+        ).merge(
+            ads_df[["id", "ssyk_code", "occupation_label"]].assign(
+                id=pd.Categorical(ads_df["id"], categories=ad_ids)
+            ),
             left_on="ad_id",
             right_on="id",
             how="left",
         )
         
         # Aggregate skill counts
-        agg = merged.groupby(["ssyk_code", "occupation_label", "skill", "skill_type"]).agg({
-            "ad_id": "count",
-            "probability": "mean",
-        }).reset_index()
+        agg = merged.groupby(
+            ["ssyk_code", "occupation_label", "skill", "skill_type"],
+            observed=True,
+            sort=False,
+            as_index=False,
+        ).agg(
+            occurrence_count=("ad_id", "count"),
+            avg_probability=("probability", "mean"),
+        )
         
-        agg.columns = ["ssyk_code", "occupation_label", "skill", "skill_type", "occurrence_count", "avg_probability"]
-        agg = agg.sort_values(["ssyk_code", "occurrence_count"], ascending=[True, False])
+        # Order by the code strings, whatever order a categorical ssyk_code's
+        # categories are in
+        agg = agg.sort_values(
+            ["ssyk_code", "occurrence_count"],
+            ascending=[True, False],
+            key=lambda column: column.astype(str) if column.name == "ssyk_code" else column,
+        )
         
         return agg
     
@@ -1,9 +1,15 @@
+import hashlib
 import logging
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv
 import requests
 import io
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+
+from data_pipeline.utils.cache import disk_cache
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +28,7 @@ class EscoIngestion:
         self.raw_dir = raw_dir / "esco"
         self.raw_dir.mkdir(parents=True, exist_ok=True)
         self.scb_file_path = self.raw_dir / "scb_ssyk_isco_key.xlsx"
+        self._cache_dir = self.raw_dir / ".cache"
 
     def fetch_scb_mapping(self) -> Path:
         """Downloads the official SSYK 2012 to ISCO-08 translation key from SCB."""
@@ -29,7 +36,7 @@ class EscoIngestion:
             logger.info("SCB SSYK key already exists.")
             return self.scb_file_path
             
-        logger.info(f"Downloading SCB SSYK-ISCO key from {self.SCB_KEY_URL}...")
+        logger.info("Downloading SCB SSYK-ISCO key from %s...", self.SCB_KEY_URL)
         try:
             resp = requests.get(self.SCB_KEY_URL)
             resp.raise_for_status()
@@ -39,31 +46,38 @@ class EscoIngestion:
             logger.info("SCB key downloaded successfully.")
             
         except Exception as e:
-            logger.error(f"Failed to download SCB key: {e}")
+            logger.error("Failed to download SCB key: %s", e)
             raise
             
         return self.scb_file_path
 
+    @disk_cache(ttl_days=30)
     def load_mapping_table(self) -> pd.DataFrame:
         """Loads and cleans the SSYK -> ISCO mapping table."""
         if not self.scb_file_path.exists():
             self.fetch_scb_mapping()
             
-        # SCB Excel has columns: 'SSYK 2012 kod', 'ISCO-08 ', 'Yrkesbenämning'
-        df = pd.read_excel(self.scb_file_path, dtype=str)
+        # SCB Excel has columns: 'SSYK 2012 kod', 'ISCO-08 ', 'Yrkesbenämning'.
+        # calamine parses .xlsx natively, much faster than openpyxl.
+        df = pd.read_excel(
+            self.scb_file_path,
+            dtype=str,
+            engine="calamine",
+            usecols=["SSYK 2012 kod", "ISCO-08 "],
+        )
         
         # Renaissance cleaning
         df = df.rename(columns={
             "SSYK 2012 kod": "ssyk_code_2012",
             "ISCO-08 ": "isco_08_code",
-            "Yrkesbenämning": "occupation_name"
         })
         
-        # Clean whitespace
-        df["ssyk_code_2012"] = df["ssyk_code_2012"].str.strip()
-        df["isco_08_code"] = df["isco_08_code"].str.strip()
+        # Clean whitespace in Arrow rather than per Python string
+        table = pa.Table.from_pandas(df[["ssyk_code_2012", "isco_08_code"]], preserve_index=False)
+        for i, name in enumerate(table.column_names):
+            table = table.set_column(i, name, pc.utf8_trim_whitespace(table[name]))
         
-        return df[["ssyk_code_2012", "isco_08_code"]]
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
 
     def process_esco_mapping(self, ssyk_taxonomy_df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -73,19 +87,48 @@ class EscoIngestion:
         - occupations.csv
         - occupations_skills.csv
         - skills.csv (optional, for skill names)
+        
+        The result is cached as Parquet, keyed on the contents of the taxonomy
+        and of every input file, so it is only rebuilt when an input changes.
         """
+        cache_path = self._cache_dir / f"enriched_{self._mapping_cache_key(ssyk_taxonomy_df)}.parquet"
+        if cache_path.exists():
+            logger.info("Loading ESCO-enriched taxonomy from cache %s", cache_path)
+            # Arrow-backed dtypes, since the skill lists are Arrow list columns
+            return pd.read_parquet(cache_path, dtype_backend="pyarrow")
         
+        final_df = self._build_esco_mapping(ssyk_taxonomy_df)
+        
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        final_df.to_parquet(cache_path, index=False)
+        return final_df
+    
+    def _mapping_cache_key(self, ssyk_taxonomy_df: pd.DataFrame) -> str:
+        """Hash the taxonomy and the SCB/ESCO input files into a cache key."""
+        digest = hashlib.sha256(pd.util.hash_pandas_object(ssyk_taxonomy_df, index=False).to_numpy().tobytes())
+        
+        for name in ["scb_ssyk_isco_key.xlsx", "occupations.csv", "occupations_skills.csv", "skills.csv"]:
+            path = self.raw_dir / name
+            if path.exists():
+                with open(path, "rb") as f:
+                    digest.update(hashlib.file_digest(f, "sha256").digest())
+            else:
+                digest.update(b"missing")
+        
+        return digest.hexdigest()[:16]
+    
+    def _build_esco_mapping(self, ssyk_taxonomy_df: pd.DataFrame) -> pd.DataFrame:
+        """Merge SCB ISCO codes and ESCO skill baskets onto the taxonomy."""
         # 1. Load SCB Key
         scb_key = self.load_mapping_table()
         
         # 2. Merge SCB Key to SSYK Data
-        # We assume ssyk_taxonomy_df has 'ssyk_code'
-        merged_df = ssyk_taxonomy_df.merge(
-            scb_key, 
-            left_on="ssyk_code", 
-            right_on="ssyk_code_2012", 
-            how="left"
-        )
+        # We assume ssyk_taxonomy_df has 'ssyk_code'. Joining against an
+        # index lets pandas reuse its hash table instead of building one.
+        merged_df = ssyk_taxonomy_df.join(
+            scb_key.set_index("ssyk_code_2012", drop=False),
+            on="ssyk_code",
+        ).reset_index(drop=True)
         
         # 3. Check for local ESCO files
         occupations_path = self.raw_dir / "occupations.csv"
@@ -103,53 +146,73 @@ class EscoIngestion:
         
         # Load ESCO Occupations to link ISCO -> ESCO Occupation URI
         # Using specific columns to save memory
-        esco_occ = pd.read_csv(occupations_path, usecols=["conceptUri", "iscoGroup"], dtype=str)
+        esco_occ = self._read_csv_columns(occupations_path, ["conceptUri", "iscoGroup"])
         
         # Filter where iscoGroup is not null
-        esco_occ = esco_occ.dropna(subset=["iscoGroup"])
+        esco_occ = esco_occ.filter(pc.is_valid(esco_occ["iscoGroup"]))
         
         # Load ESCO Skills Relationships
-        esco_rels = pd.read_csv(relations_path, dtype=str)
-        # Should have columns like: occupationUri, skillUri, relationType, ...
+        esco_rels = self._read_csv_columns(relations_path, ["occupationUri", "skillUri", "relationType"])
         # Standardize standard v1.2 columns checking might be needed if format varies
         
-        # Filter for 'essential' skills if relationType exists
-        if "relationType" in esco_rels.columns:
-            esco_rels = esco_rels[esco_rels["relationType"] == "essential"]
-            
-        # Aggregate Skills per Occupation URI
-        # occupationUri -> [skillUri, skillUri]
-        occ_skills_map = esco_rels.groupby("occupationUri")["skillUri"].apply(list).reset_index()
+        # Filter for 'essential' skills if relationType exists (in Arrow,
+        # before any Python strings are created)
+        if esco_rels["relationType"].null_count < esco_rels.num_rows:
+            esco_rels = esco_rels.filter(pc.equal(esco_rels["relationType"], "essential"))
         
-        # Merge Skills map back to Occupations
-        # iscoGroup -> [Skill URIs] (Note: One ISCO group has MANY ESCO occupations, so this is a 1-to-many explosion)
+        esco_occ = esco_occ.to_pandas(types_mapper=pd.ArrowDtype)
+        esco_rels = esco_rels.drop_columns(["relationType"]).to_pandas(
+            types_mapper=pd.ArrowDtype, split_blocks=True, self_destruct=True
+        )
+            
         # Strategy: We want to map SSYK -> ISCO -> [Aggregated ESCO Skills for that ISCO family]
-        
-        # Join ESCO Occupations with their Skills
-        esco_full = esco_occ.merge(occ_skills_map, left_on="conceptUri", right_on="occupationUri", how="inner")
+        # (Note: One ISCO group has MANY ESCO occupations, so this is a 1-to-many explosion)
+        
+        # Join ESCO Occupations with their Skills, one row per (occupation, skill)
+        esco_full = esco_occ.merge(
+            esco_rels[["occupationUri", "skillUri"]],
+            left_on="conceptUri",
+            right_on="occupationUri",
+            how="inner",
+        )
         
         # Aggregate ALL skills for an entire ISCO group
         # This is a broad approach: "If you are in this ISCO group, here is the universe of ESCO skills associated with it"
         # Since SSYK is roughly ISCO, this gives a "basket of likely skills"
-        isco_skills_agg = esco_full.groupby("iscoGroup")["skillUri"].sum().reset_index()
-        
-        # Function to deduplicate list
-        isco_skills_agg["esco_skill_uris"] = isco_skills_agg["skillUri"].apply(lambda x: list(set(x)))
+        # Deduplicating the long table first avoids concatenating per-occupation lists
+        # The groupby result is already indexed by iscoGroup, ready to join on
+        isco_skills_agg = (
+            esco_full.drop_duplicates(["iscoGroup", "skillUri"])
+            .groupby("iscoGroup")["skillUri"]
+            .agg(list)
+            .to_frame("esco_skill_uris")
+        )
+        isco_skills_agg.insert(0, "iscoGroup", isco_skills_agg.index)
         
         # 4. Merge ESCO Skills to SSYK Data
-        final_df = merged_df.merge(
-            isco_skills_agg[["iscoGroup", "esco_skill_uris"]],
-            left_on="isco_08_code",
-            right_on="iscoGroup",
-            how="left"
-        )
+        final_df = merged_df.join(isco_skills_agg, on="isco_08_code")
         
-        logger.info(f"Enriched {final_df['esco_skill_uris'].notna().sum()} rows with ESCO skills mapping")
+        logger.info("Enriched %d rows with ESCO skills mapping", final_df['esco_skill_uris'].notna().sum())
         
         return final_df
 
+    @staticmethod
+    def _read_csv_columns(path: Path, columns: List[str]) -> pa.Table:
+        """Read selected columns of a CSV as strings with pyarrow.
+        
+        Columns missing from the file come back as all-null.
+        """
+        return csv.read_csv(
+            path,
+            convert_options=csv.ConvertOptions(
+                include_columns=columns,
+                include_missing_columns=True,
+                column_types={col: pa.string() for col in columns},
+            ),
+        )
+
     def save_processed(self, df: pd.DataFrame, output_dir: Path) -> Path:
         output_path = output_dir / "taxonomy_esco_enriched.parquet"
         df.to_parquet(output_path, index=False)
-        logger.info(f"Saved ESCO-enriched taxonomy to {output_path}")
+        logger.info("Saved ESCO-enriched taxonomy to %s", output_path)
         return output_path
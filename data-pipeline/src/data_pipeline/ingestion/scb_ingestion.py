@@ -1,20 +1,24 @@
 """SCB (Statistics Sweden) data ingestion module.
 
 This module fetches income data from SCB's API using JSON-stat2 format.
-Implements rate limiting (3 req/sec) and request chunking to stay within
-SCB's limits (30 req/10 sec, 150K cells/request).
+Implements sliding-window rate limiting (at most 30 requests in any 10 seconds)
+and request chunking to stay within SCB's limits (30 req/10 sec, 150K cells/request).
 """
 
 import httpx
+import numpy as np
 import pandas as pd
 from pyjstat import pyjstat
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import time
 import logging
 import hashlib
 import os
 
+from data_pipeline.utils.http_client import SlidingWindowLimiter, read_json, request_with_retry
+from data_pipeline.utils.parquet import PARQUET_WRITE_OPTIONS
+
 logger = logging.getLogger(__name__)
 
 # NUTS region code to name mapping (used in this SCB table)
@@ -64,6 +68,29 @@ DISPERSION_CONTENTS_CODES = {
 # Fallback codes if metadata fetch fails
 DEFAULT_SSYK_CODES = ["2512", "2513", "2514"] 
 
+# Candidate code columns (first present wins) -> label column and mapping
+CONTENTS_COLUMNS = ("ContentsCode", "contents")
+LABEL_MAPPINGS = [
+    (("Region", "region"), "region_name", NUTS_REGION_CODES),
+    (("Sektor", "sector"), "sector_name", SECTOR_CODES),
+    (("Kon", "sex", "gender", "kön"), "gender", GENDER_CODES),
+    (CONTENTS_COLUMNS, "measure", CONTENTS_CODES),
+]
+
+# Low-cardinality code and label columns, stored as categoricals so Parquet
+# dictionary-encodes them
+CATEGORICAL_COLUMNS = [
+    "Region", "Sektor", "Kon", "ContentsCode", "Yrke2012",
+    "region_name", "sector_name", "gender", "measure",
+]
+
+# Dimension columns hashed into the surrogate key, in key order
+SURROGATE_KEY_COLUMNS = [
+    "Tid", "Region", "Yrke2012", "Kon", "ContentsCode",
+    "year", "region", "occupation", "sex", "contents",
+    "Alder", "age", "Utbildningsniva", "education_level",
+]
+
 
 class SCBIngestion:
     """Handles data ingestion from Statistics Sweden (SCB) API."""
@@ -74,13 +101,16 @@ class SCBIngestion:
     AGE_ENDPOINT = "/AM/AM0110/AM0110A/LonYrkeAlder4AN"
     EDUCATION_ENDPOINT = "/AM/AM0110/AM0110A/LonYrkeUtb4AN"
     
-    # Rate limiting: 1 request per second (safe/slow as requested)
-    MIN_REQUEST_INTERVAL = 1.0
-    CHUNK_SIZE = 50 
+    # Rate limiting: SCB allows 30 requests per 10 seconds
+    RATE_LIMIT_REQUESTS = 30
+    RATE_LIMIT_WINDOW = 10.0
+    # SCB rejects queries over 150K cells; stay well under it
+    MAX_CELLS_PER_REQUEST = 100_000
+    MAX_CONCURRENT_REQUESTS = 4
     
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key
-        self._last_request_time = 0.0
+        self._limiter = SlidingWindowLimiter(self.RATE_LIMIT_REQUESTS, self.RATE_LIMIT_WINDOW)
         self.ssyk_mapping = {}
         
         headers = {
@@ -90,31 +120,74 @@ class SCBIngestion:
         if api_key:
             headers["Authorization"] = f"Bearer {api_key}"
         
+        # HTTP/2 multiplexes the chunked queries over a single connection;
+        # http2/limits must go on the transport when one is passed explicitly
         self.client = httpx.Client(
             headers=headers,
             timeout=60.0,
+            transport=httpx.HTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=8, max_connections=8),
+                retries=2,
+            ),
         )
 
-    def _rate_limit(self):
-        """Enforce rate limiting between requests."""
-        elapsed = time.time() - self._last_request_time
-        if elapsed < self.MIN_REQUEST_INTERVAL:
-            time.sleep(self.MIN_REQUEST_INTERVAL - elapsed)
-        self._last_request_time = time.time()
-
     def _chunk_list(self, lst: List, chunk_size: int) -> List[List]:
         return [lst[i:i + chunk_size] for i in range(0, len(lst), chunk_size)]
 
+    def _fetch_chunks(
+        self,
+        endpoint: str,
+        occupation_codes: List[str],
+        build_query: Callable[[List[str]], Dict],
+        add_labels: Callable[[pd.DataFrame], pd.DataFrame],
+    ) -> List[pd.DataFrame]:
+        """POST one query per chunk of occupations, several at a time.
+        
+        Chunks are sized so each query stays under MAX_CELLS_PER_REQUEST; the
+        shared rate limiter keeps the concurrent requests within SCB's quota,
+        and rate-limited (429) or failed (5xx) chunks are retried. Results are returned in chunk order.
+        """
+        # Cells per occupation: the product of every other dimension's size
+        cells_per_code = 1
+        for selection in build_query([""])["query"]:
+            cells_per_code *= len(selection["selection"]["values"])
+        chunk_size = max(1, self.MAX_CELLS_PER_REQUEST // max(cells_per_code, 1))
+        chunks = self._chunk_list(occupation_codes, chunk_size)
+        
+        url = f"{self.BASE_URL}{endpoint}"
+        logger.debug("Fetching %s in %s chunks of up to %s occupations", url, len(chunks), chunk_size)
+        # Load the SSYK labels once, before the workers need them
+        self._ensure_ssyk_mapping()
+        
+        def fetch_chunk(i: int, chunk: List[str]) -> pd.DataFrame:
+            try:
+                response = request_with_retry(
+                    self.client, "POST", url, bucket=self._limiter, json=build_query(chunk)
+                )
+                response.raise_for_status()
+                df = add_labels(self._parse_jsonstat2(read_json(response)))
+                logger.debug("Chunk %s fetched %s rows", i + 1, len(df))
+                return df
+            except Exception as e:
+                logger.error("Error fetching chunk %s from %s: %s", i + 1, endpoint, e)
+                raise
+        
+        executor = ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_REQUESTS)
+        try:
+            return list(executor.map(fetch_chunk, range(len(chunks)), chunks))
+        finally:
+            executor.shutdown(cancel_futures=True)
+
     def _fetch_metadata(self, endpoint: str) -> Dict:
-        self._rate_limit()
         url = f"{self.BASE_URL}{endpoint}"
-        logger.debug(f"Fetching metadata from {url}")
+        logger.debug("Fetching metadata from %s", url)
         try:
-            response = self.client.get(url)
+            response = request_with_retry(self.client, "GET", url, bucket=self._limiter)
             response.raise_for_status()
-            return response.json()
+            return read_json(response)
         except Exception as e:
-            logger.error(f"Error fetching metadata from {url}: {e}")
+            logger.error("Error fetching metadata from %s: %s", url, e)
             raise
         
     def _validate_years(self, endpoint: str, requested_years: List[str]) -> List[str]:
@@ -132,13 +205,13 @@ class SCBIngestion:
 
             valid_years = [y for y in requested_years if y in available_years]
             if not valid_years:
-                logger.warning(f"No requested years {requested_years} found in {endpoint}. Available: {available_years}")
+                logger.warning("No requested years %s found in %s. Available: %s", requested_years, endpoint, available_years)
             elif len(valid_years) < len(requested_years):
-                logger.debug(f"Filtered years for {endpoint}: requested {len(requested_years)}, valid {len(valid_years)}")
+                logger.debug("Filtered years for %s: requested %d, valid %d", endpoint, len(requested_years), len(valid_years))
             
             return valid_years
         except Exception as e:
-            logger.warning(f"Failed to validate years for {endpoint}: {e}")
+            logger.warning("Failed to validate years for %s: %s", endpoint, e)
             return requested_years
 
     def _ensure_ssyk_mapping(self):
@@ -152,7 +225,7 @@ class SCBIngestion:
                         self.ssyk_mapping = dict(zip(codes, labels))
                         break
             except Exception as e:
-                logger.error(f"Failed to fetch SSYK mapping: {e}")
+                logger.error("Failed to fetch SSYK mapping: %s", e)
 
     def get_all_ssyk_codes(self) -> List[str]:
         """Fetch all available SSYK 2012 codes from SCB metadata."""
@@ -190,13 +263,8 @@ class SCBIngestion:
         if sectors is None:
             sectors = ["0"]
         
-        chunks = self._chunk_list(occupation_codes, self.CHUNK_SIZE)
-        all_dfs = []
-        
-        logger.info(f"Fetching regional income data for {len(occupation_codes)} occupations in {len(chunks)} chunks. Years: {valid_years}")
-
-        for i, chunk in enumerate(chunks):
-            query = {
+        def build_query(chunk: List[str]) -> Dict:
+            return {
                 "query": [
                     {"code": "Region", "selection": {"filter": "item", "values": region_codes}},
                     {"code": "Sektor", "selection": {"filter": "item", "values": sectors}},
@@ -207,28 +275,17 @@ class SCBIngestion:
                 ],
                 "response": {"format": "json-stat2"}
             }
-            
-            self._rate_limit()
-            url = f"{self.BASE_URL}{self.INCOME_ENDPOINT}"
-            
-            try:
-                response = self.client.post(url, json=query)
-                response.raise_for_status()
-                df = self._parse_jsonstat2(response.json())
-                df = self._add_labels(df)
-                all_dfs.append(df)
-                logger.debug(f"Chunk {i+1} fetched {len(df)} rows")
-            except Exception as e:
-                logger.error(f"Error fetching chunk {i+1}: {e}")
-                raise
+        
+        logger.info("Fetching regional income data for %s occupations. Years: %s", len(occupation_codes), valid_years)
+        all_dfs = self._fetch_chunks(self.INCOME_ENDPOINT, occupation_codes, build_query, self._add_labels)
 
         if not all_dfs:
             return pd.DataFrame()
 
         final_df = pd.concat(all_dfs, ignore_index=True)
-        final_df["surrogate_key"] = final_df.apply(lambda row: self._generate_surrogate_key(row), axis=1)
+        final_df["surrogate_key"] = self._generate_surrogate_keys(final_df)
         
-        logger.info(f"Successfully fetched total {len(final_df)} regional income records")
+        logger.info("Successfully fetched total %d regional income records", len(final_df))
         return final_df
 
     def fetch_salary_dispersion(
@@ -253,13 +310,8 @@ class SCBIngestion:
         if sectors is None:
             sectors = ["0"]
         
-        chunks = self._chunk_list(occupation_codes, self.CHUNK_SIZE)
-        all_dfs = []
-        
-        logger.info(f"Fetching salary dispersion data for {len(occupation_codes)} occupations in {len(chunks)} chunks. Years: {valid_years}")
-        
-        for i, chunk in enumerate(chunks):
-            query = {
+        def build_query(chunk: List[str]) -> Dict:
+            return {
                 "query": [
                     {"code": "Sektor", "selection": {"filter": "item", "values": sectors}},
                     {"code": "Yrke2012", "selection": {"filter": "item", "values": chunk}},
@@ -269,28 +321,18 @@ class SCBIngestion:
                 ],
                 "response": {"format": "json-stat2"}
             }
-            
-            self._rate_limit()
-            url = f"{self.BASE_URL}{self.DISPERSION_ENDPOINT}"
-            
-            try:
-                response = self.client.post(url, json=query)
-                response.raise_for_status()
-                df = self._parse_jsonstat2(response.json())
-                df = self._add_dispersion_labels(df)
-                all_dfs.append(df)
-            except Exception as e:
-                logger.error(f"Error fetching dispersion chunk {i+1}: {e}")
-                raise
+        
+        logger.info("Fetching salary dispersion data for %s occupations. Years: %s", len(occupation_codes), valid_years)
+        all_dfs = self._fetch_chunks(self.DISPERSION_ENDPOINT, occupation_codes, build_query, self._add_dispersion_labels)
         
         if not all_dfs:
             return pd.DataFrame()
             
         combined_df = pd.concat(all_dfs, ignore_index=True)
         pivoted_df = self._pivot_dispersion_data(combined_df)
-        pivoted_df["surrogate_key"] = pivoted_df.apply(lambda row: self._generate_surrogate_key(row), axis=1)
+        pivoted_df["surrogate_key"] = self._generate_surrogate_keys(pivoted_df)
         
-        logger.info(f"Successfully fetched {len(pivoted_df)} dispersion records")
+        logger.info("Successfully fetched %d dispersion records", len(pivoted_df))
         return pivoted_df
 
     def fetch_income_by_age(
@@ -320,7 +362,7 @@ class SCBIngestion:
                     available_years = var["values"]
                     valid_years = [y for y in years if y in available_years]
         except Exception as e:
-            logger.warning(f"Could not fetch Age metadata: {e}")
+            logger.warning("Could not fetch Age metadata: %s", e)
             age_codes = ["Tot"] 
         
         if not age_codes:
@@ -330,13 +372,8 @@ class SCBIngestion:
             logger.warning("No valid years for age data")
             return pd.DataFrame()
 
-        chunks = self._chunk_list(occupation_codes, self.CHUNK_SIZE)
-        all_dfs = []
-        
-        logger.info(f"Fetching income by age for {len(occupation_codes)} occupations in {len(chunks)} chunks. Years: {valid_years}")
-
-        for i, chunk in enumerate(chunks):
-            query = {
+        def build_query(chunk: List[str]) -> Dict:
+            return {
                 "query": [
                     {"code": "Sektor", "selection": {"filter": "item", "values": sectors}},
                     {"code": "Yrke2012", "selection": {"filter": "item", "values": chunk}},
@@ -347,26 +384,16 @@ class SCBIngestion:
                 ],
                 "response": {"format": "json-stat2"}
             }
-            
-            self._rate_limit()
-            url = f"{self.BASE_URL}{self.AGE_ENDPOINT}"
-            
-            try:
-                response = self.client.post(url, json=query)
-                response.raise_for_status()
-                df = self._parse_jsonstat2(response.json())
-                df = self._add_labels(df)
-                all_dfs.append(df)
-            except Exception as e:
-                logger.error(f"Error fetching age chunk {i+1}: {e}")
-                raise
+        
+        logger.info("Fetching income by age for %s occupations. Years: %s", len(occupation_codes), valid_years)
+        all_dfs = self._fetch_chunks(self.AGE_ENDPOINT, occupation_codes, build_query, self._add_labels)
 
         if not all_dfs:
             return pd.DataFrame()
 
         final_df = pd.concat(all_dfs, ignore_index=True)
-        final_df["surrogate_key"] = final_df.apply(lambda row: self._generate_surrogate_key(row), axis=1)
-        logger.info(f"Successfully fetched {len(final_df)} age records")
+        final_df["surrogate_key"] = self._generate_surrogate_keys(final_df)
+        logger.info("Successfully fetched %d age records", len(final_df))
         return final_df
 
     def fetch_income_by_education(
@@ -396,7 +423,7 @@ class SCBIngestion:
                     available_years = var["values"]
                     valid_years = [y for y in years if y in available_years]
         except Exception as e:
-            logger.warning(f"Could not fetch Education metadata: {e}")
+            logger.warning("Could not fetch Education metadata: %s", e)
             return pd.DataFrame()
         
         if not edu_codes:
@@ -406,13 +433,8 @@ class SCBIngestion:
             logger.warning("No valid years for education data")
             return pd.DataFrame()
 
-        chunks = self._chunk_list(occupation_codes, self.CHUNK_SIZE)
-        all_dfs = []
-        
-        logger.info(f"Fetching income by education for {len(occupation_codes)} occupations in {len(chunks)} chunks. Years: {valid_years}")
-
-        for i, chunk in enumerate(chunks):
-            query = {
+        def build_query(chunk: List[str]) -> Dict:
+            return {
                 "query": [
                     {"code": "Sektor", "selection": {"filter": "item", "values": sectors}},
                     {"code": "Yrke2012", "selection": {"filter": "item", "values": chunk}},
@@ -423,39 +445,24 @@ class SCBIngestion:
                 ],
                 "response": {"format": "json-stat2"}
             }
-
-            self._rate_limit()
-            url = f"{self.BASE_URL}{self.EDUCATION_ENDPOINT}"
-            
-            try:
-                response = self.client.post(url, json=query)
-                response.raise_for_status()
-                df = self._parse_jsonstat2(response.json())
-                df = self._add_labels(df)
-                all_dfs.append(df)
-            except Exception as e:
-                logger.error(f"Error fetching education chunk {i+1}: {e}")
-                raise
+        
+        logger.info("Fetching income by education for %s occupations. Years: %s", len(occupation_codes), valid_years)
+        all_dfs = self._fetch_chunks(self.EDUCATION_ENDPOINT, occupation_codes, build_query, self._add_labels)
 
         if not all_dfs:
             return pd.DataFrame()
 
         final_df = pd.concat(all_dfs, ignore_index=True)
-        final_df["surrogate_key"] = final_df.apply(lambda row: self._generate_surrogate_key(row), axis=1)
-        logger.info(f"Successfully fetched {len(final_df)} education records")
+        final_df["surrogate_key"] = self._generate_surrogate_keys(final_df)
+        logger.info("Successfully fetched %d education records", len(final_df))
         return final_df
 
     def _add_dispersion_labels(self, df: pd.DataFrame) -> pd.DataFrame:
         df = self._add_labels(df)
         
-        contents_col = None
-        for col in ["ContentsCode", "contents"]:
-            if col in df.columns:
-                contents_col = col
-                break
-        
+        contents_col = self._find_column(set(df.columns), CONTENTS_COLUMNS)
         if contents_col:
-            df["measure"] = df[contents_col].map(DISPERSION_CONTENTS_CODES)
+            df["measure"] = self._map_codes(df[contents_col], DISPERSION_CONTENTS_CODES)
         
         return df
     
@@ -487,15 +494,20 @@ class SCBIngestion:
             if "occupation_name" not in pivot_df.columns and self.ssyk_mapping:
                 for col in ["Yrke2012", "occupation"]:
                     if col in pivot_df.columns:
-                        pivot_df["occupation_name"] = pivot_df[col].map(self.ssyk_mapping)
+                        pivot_df["occupation_name"] = self._map_codes(pivot_df[col], self.ssyk_mapping)
                         break
             
             return pivot_df
         except Exception as e:
-            logger.warning(f"Pivot failed: {e}, returning long format")
+            logger.warning("Pivot failed: %s, returning long format", e)
             return df
     
     def _parse_jsonstat2(self, data: Dict) -> pd.DataFrame:
+        # Only hand pyjstat payloads it can parse, rather than paying for an
+        # exception on every malformed response
+        if not self._looks_like_jsonstat2(data):
+            return self._manual_parse_jsonstat2(data)
+        
         try:
             # Force using IDs instead of labels
             datasets = pyjstat.from_json_stat(data, naming='id')
@@ -505,12 +517,20 @@ class SCBIngestion:
                     df["value"] = pd.to_numeric(df["value"], errors="coerce")
                 return df
         except Exception as e:
-            logger.warning(f"pyjstat parsing failed: {e}, trying manual parse")
+            logger.warning("pyjstat parsing failed: %s, trying manual parse", e)
         
         return self._manual_parse_jsonstat2(data)
     
+    @staticmethod
+    def _looks_like_jsonstat2(data: Dict) -> bool:
+        return (
+            data.get("class") == "dataset"
+            and "value" in data
+            and "dimension" in data
+            and "id" in data
+        )
+    
     def _manual_parse_jsonstat2(self, data: Dict) -> pd.DataFrame:
-        records = []
         dimensions = data.get("dimension", {})
         dim_ids = data.get("id", [])
         values = data.get("value", [])
@@ -527,111 +547,131 @@ class SCBIngestion:
             else:
                 dim_values[dim_id] = list(label.keys()) if label else []
         
-        from itertools import product
-        all_combinations = list(product(*[dim_values[d] for d in dim_ids]))
-        
-        for i, combo in enumerate(all_combinations):
-            if i < len(values):
-                record = dict(zip(dim_ids, combo))
-                record["value"] = values[i]
-                records.append(record)
-        
-        df = pd.DataFrame(records)
-        if "value" in df.columns:
-            df["value"] = pd.to_numeric(df["value"], errors="coerce")
+        # Values are in row-major order over the dimensions, so each dimension
+        # column is its categories repeated by the size of the later dimensions
+        # and tiled by the size of the earlier ones
+        sizes = [len(dim_values[d]) for d in dim_ids]
+        total = int(np.prod(sizes))
+        n_rows = min(total, len(values))
+        
+        columns = {}
+        inner = total
+        for dim_id, size in zip(dim_ids, sizes):
+            if total == 0:
+                columns[dim_id] = np.array([], dtype=object)
+                continue
+            inner //= size
+            outer = total // (inner * size)
+            column = np.repeat(np.array(dim_values[dim_id], dtype=object), inner)
+            columns[dim_id] = np.tile(column, outer)[:n_rows]
+        
+        df = pd.DataFrame(columns)
+        df["value"] = pd.to_numeric(pd.Series(values[:n_rows], dtype=object), errors="coerce")
         
         return df
     
+    @staticmethod
+    def _map_codes(codes: pd.Series, mapping: Dict[str, str]) -> pd.Series:
+        """Map codes to labels, looking up each distinct code only once.
+        
+        Returns a categorical Series; codes missing from the mapping become NaN.
+        """
+        cat = pd.Categorical(codes)
+        label_codes, labels = pd.factorize(cat.categories.map(mapping))
+        # Append -1 so missing codes (code -1) index to a missing label
+        codes_to_labels = np.append(label_codes, -1)
+        return pd.Series(
+            pd.Categorical.from_codes(codes_to_labels[cat.codes], categories=labels),
+            index=codes.index,
+        )
+    
+    @staticmethod
+    def _find_column(columns: set, candidates: Sequence[str]) -> Optional[str]:
+        """Return the first candidate present in ``columns``, if any."""
+        return next((col for col in candidates if col in columns), None)
+    
     def _add_labels(self, df: pd.DataFrame) -> pd.DataFrame:
-        # Map NUTS region codes
-        region_col = None
-        for col in ["Region", "region"]:
-            if col in df.columns:
-                region_col = col
-                break
+        columns = set(df.columns)
         
-        if region_col:
-            df["region_name"] = df[region_col].map(NUTS_REGION_CODES)
-        
-        # Map sector codes
-        sector_col = None
-        for col in ["Sektor", "sector"]:
-            if col in df.columns:
-                sector_col = col
-                break
-        
-        if sector_col:
-            df["sector_name"] = df[sector_col].map(SECTOR_CODES)
-        
-        # Map gender codes
-        gender_col = None
-        for col in ["Kon", "sex", "gender", "kön"]:
-            if col in df.columns:
-                gender_col = col
-                break
-        
-        if gender_col:
-            df["gender"] = df[gender_col].map(GENDER_CODES)
-        
-        # Map contents codes
-        contents_col = None
-        for col in ["ContentsCode", "contents"]:
-            if col in df.columns:
-                contents_col = col
-                break
-        
-        if contents_col:
-            df["measure"] = df[contents_col].map(CONTENTS_CODES)
+        # NUTS region, sector, gender and contents codes
+        for candidates, label_col, mapping in LABEL_MAPPINGS:
+            code_col = self._find_column(columns, candidates)
+            if code_col:
+                df[label_col] = self._map_codes(df[code_col], mapping)
         
         # Map SSYK codes
         self._ensure_ssyk_mapping()
         if self.ssyk_mapping:
-             for col in ["Yrke2012", "occupation", "ssyk_code"]:
-                if col in df.columns:
-                    df["occupation_name"] = df[col].map(self.ssyk_mapping)
-                    break
+            occupation_col = self._find_column(columns, ("Yrke2012", "occupation", "ssyk_code"))
+            if occupation_col:
+                df["occupation_name"] = self._map_codes(df[occupation_col], self.ssyk_mapping)
 
         return df
     
-    def _generate_surrogate_key(self, row: pd.Series) -> str:
-        key_parts = []
-        for col in ["Tid", "Region", "Yrke2012", "Kon", "ContentsCode", 
-                    "year", "region", "occupation", "sex", "contents",
-                    "Alder", "age", "Utbildningsniva", "education_level"]:
-            if col in row.index:
-                key_parts.append(str(row[col]))
-        
-        key_string = "|".join(key_parts)
-        return hashlib.md5(key_string.encode()).hexdigest()[:16]
+    def _generate_surrogate_keys(self, df: pd.DataFrame) -> pd.Series:
+        """Hash each row's dimension values into a 16-character surrogate key.
+        
+        The key columns are joined column-wise, so only the md5 runs per row;
+        the truncated digests are hex-encoded in one pass.
+        """
+        cols = [col for col in SURROGATE_KEY_COLUMNS if col in df.columns]
+        if cols:
+            key_strings = df[cols[0]].astype(str).str.cat([df[col].astype(str) for col in cols[1:]], sep="|")
+        else:
+            key_strings = pd.Series("", index=df.index)
+        
+        # Encode all keys in one pass and bind md5 outside the loop
+        md5 = hashlib.md5
+        digests = b"".join(md5(key).digest()[:8] for key in key_strings.str.encode("utf-8"))
+        return pd.Series(
+            np.frombuffer(digests.hex().encode("ascii"), dtype="S16").astype(str),
+            index=df.index,
+            dtype=str,
+        )
+    
+    def _categorize(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Store low-cardinality code and label columns as categoricals."""
+        return df.astype({col: "category" for col in CATEGORICAL_COLUMNS if col in df.columns})
     
     def save_to_parquet(self, df: pd.DataFrame, filepath: Path) -> Path:
         filepath = Path(filepath)
         filepath.parent.mkdir(parents=True, exist_ok=True)
-        df.to_parquet(filepath, index=False, engine="pyarrow")
-        logger.info(f"Saved {len(df)} records to {filepath}")
+        df = self._categorize(df)
+        df.to_parquet(filepath, index=False, engine="pyarrow", **PARQUET_WRITE_OPTIONS)
+        logger.info("Saved %d records to %s", len(df), filepath)
         return filepath
     
     def save_to_gcs(self, df: pd.DataFrame, bucket_name: str, blob_name: str):
         from google.cloud import storage
-        import tempfile
-        import os
         
-        logger.info(f"Saving data to GCS: gs://{bucket_name}/{blob_name}")
+        logger.info("Saving data to GCS: gs://%s/%s", bucket_name, blob_name)
         
-        with tempfile.NamedTemporaryFile(suffix=".parquet", delete=False) as f:
-            temp_file = f.name
+        df = self._categorize(df)
+        client = storage.Client()
+        blob = client.bucket(bucket_name).blob(blob_name)
+        # Stream the Parquet bytes straight into a resumable upload; pyarrow
+        # flushes the file it writes to, which BlobWriter only allows if ignored
+        with blob.open("wb", content_type="application/octet-stream", ignore_flush=True) as f:
+            df.to_parquet(f, index=False, engine="pyarrow", **PARQUET_WRITE_OPTIONS)
         
-        try:
-            df.to_parquet(temp_file, index=False, engine="pyarrow")
-            
-            client = storage.Client()
-            bucket = client.bucket(bucket_name)
-            blob = bucket.blob(blob_name)
-            blob.upload_from_filename(temp_file)
-            
-            logger.info(f"Successfully saved to GCS")
-        finally:
-            os.unlink(temp_file)
+        logger.info("Successfully saved to GCS")
+    
+    def save_file_to_gcs(self, local_path: Path, bucket_name: str, blob_name: str):
+        """Upload an existing local file to Google Cloud Storage as-is.
+        
+        Args:
+            local_path: Path to the file to upload
+            bucket_name: GCS bucket name
+            blob_name: Blob name/path in bucket
+        """
+        from google.cloud import storage
+        
+        logger.info("Uploading %s to GCS: gs://%s/%s", local_path, bucket_name, blob_name)
+        
+        client = storage.Client()
+        bucket = client.bucket(bucket_name)
+        blob = bucket.blob(blob_name)
+        blob.upload_from_filename(str(local_path))
     
     def close(self):
         self.client.close()
@@ -1,11 +1,17 @@
 
-import requests
-import json
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pa_json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from data_pipeline.utils.http_client import create_client
+from data_pipeline.utils.parquet import PARQUET_WRITE_OPTIONS
+
 logger = logging.getLogger(__name__)
 
 class TaxonomyIngestion:
@@ -17,58 +23,106 @@ class TaxonomyIngestion:
         "ssyk_hierarchy": "https://data.arbetsformedlingen.se/taxonomy/version/27/query/the-ssyk-hierarchy-with-occupations/the-ssyk-hierarchy-with-occupations.json"
     }
     
+    TIMEOUT = 60.0
+    
     def __init__(self, raw_dir: Path):
         self.raw_dir = raw_dir / "taxonomy"
         self.raw_dir.mkdir(parents=True, exist_ok=True)
+        # All three files come from the same host; reuse one HTTP/2 connection
+        self.client = create_client()
         
     def fetch_files(self):
         """Downloads the required taxonomy files."""
+        missing = {}
         for name, url in self.URLS.items():
             filepath = self.raw_dir / f"{name}.json"
             if filepath.exists():
-                logger.info(f"Taxonomy file {name} already exists.")
-                continue
-                
-            logger.info(f"Fetching taxonomy file {name}...")
-            try:
-                resp = requests.get(url)
+                logger.info("Taxonomy file %s already exists.", name)
+            else:
+                missing[name] = url
+        
+        # The files are independent, so download them concurrently over the
+        # shared client
+        with ThreadPoolExecutor(max_workers=max(len(missing), 1)) as executor:
+            # Consume the results so a failed download is raised here
+            list(executor.map(self._fetch_file, missing.keys(), missing.values()))
+    
+    def _fetch_file(self, name: str, url: str):
+        """Streams one taxonomy file to disk."""
+        filepath = self.raw_dir / f"{name}.json"
+        logger.info("Fetching taxonomy file %s...", name)
+        # Stream the body to disk verbatim; rename only once complete so an
+        # interrupted download is not mistaken for a cached file
+        partial_path = filepath.with_suffix(".json.part")
+        try:
+            with self.client.stream("GET", url, timeout=self.TIMEOUT) as resp:
                 resp.raise_for_status()
-                with open(filepath, "w") as f:
-                    json.dump(resp.json(), f)
-            except Exception as e:
-                logger.error(f"Failed to fetch {name}: {e}")
-                raise
+                with open(partial_path, "wb") as f:
+                    for chunk in resp.iter_bytes():
+                        f.write(chunk)
+            partial_path.replace(filepath)
+        except Exception as e:
+            logger.error("Failed to fetch %s: %s", name, e)
+            partial_path.unlink(missing_ok=True)
+            raise
 
     def load_json(self, name: str) -> Dict:
-        with open(self.raw_dir / f"{name}.json", "r") as f:
-            return json.load(f)
+        return orjson.loads((self.raw_dir / f"{name}.json").read_bytes())
+
+    def load_concepts_table(self, name: str) -> pa.StructArray:
+        """Reads a taxonomy file's concepts with Arrow's JSON reader.
+        
+        Returns one struct per concept, with nested lists kept as Arrow arrays
+        instead of Python dicts.
+        """
+        path = self.raw_dir / f"{name}.json"
+        # The file is a single (possibly pretty-printed) document, so read it
+        # as one block
+        table = pa_json.read_json(
+            path,
+            read_options=pa_json.ReadOptions(block_size=path.stat().st_size + 1),
+            parse_options=pa_json.ParseOptions(newlines_in_values=True),
+        )
+        return pc.list_flatten(table.column("data").combine_chunks().field("concepts"))
 
     def _extract_occupations_from_hierarchy(self, concepts: List[Dict]) -> Dict[str, List[str]]:
-        """Recursively traverses the hierarchy to find SSYK Level 4 to Occupation mappings."""
+        """Walks the hierarchy to find SSYK Level 4 to Occupation mappings."""
         mapping = {}
+        # Iterative pre-order walk; children are pushed reversed so they are
+        # visited in document order
+        stack = list(reversed(concepts))
         
-        for item in concepts:
-            item_type = item.get("type")
+        while stack:
+            item = stack.pop()
+            children = item.get("narrower", [])
             
-            # If we hit Level 4, extract its occupations
-            if item_type == "ssyk-level-4":
+            # If we hit Level 4, extract its occupations; its children are
+            # occupation names, so there is nothing further to descend into
+            if item.get("type") == "ssyk-level-4":
                 ssyk_code = item.get("ssyk_code_2012")
-                occupations = []
-                for child in item.get("narrower", []):
-                    if child.get("type") == "occupation-name":
-                        occupations.append(child.get("preferred_label"))
-                
                 if ssyk_code:
-                    mapping[ssyk_code] = occupations
+                    mapping[ssyk_code] = [
+                        child.get("preferred_label")
+                        for child in children
+                        if child.get("type") == "occupation-name"
+                    ]
+                continue
             
-            # Recurse if there are children (regardless of current type, as long as it's not the leaf)
-            if "narrower" in item:
-                 # Recursive merge
-                 child_map = self._extract_occupations_from_hierarchy(item.get("narrower", []))
-                 mapping.update(child_map)
+            stack.extend(reversed(children))
                  
         return mapping
 
+    def get_ssyk_codes_only(self) -> List[str]:
+        """Returns the SSYK Level 4 codes without building the full taxonomy."""
+        fields_data = self.load_json("occupation_fields")
+        codes = {
+            group.get("ssyk_code_2012")
+            for field in fields_data["data"]["concepts"]
+            for group in field.get("narrower", [])
+            if group.get("id") and group.get("ssyk_code_2012")
+        }
+        return sorted(codes)
+
     def process_taxonomy(self) -> pd.DataFrame:
         """Joins occupation fields, skills, and hierarchy data into a unified DataFrame."""
         
@@ -92,57 +146,64 @@ class TaxonomyIngestion:
                         "taxonomy_id": tid
                     }
         
-        logger.info(f"Found {len(ssyk_map)} SSYK Level 4 groups in occupation fields")
+        logger.info("Found %d SSYK Level 4 groups in occupation fields", len(ssyk_map))
         
         # 2. Parse Hierarchy to get comprehensive Occupation Name list
         hierarchy_data = self.load_json("ssyk_hierarchy")
         hierarchy_occupations_map = self._extract_occupations_from_hierarchy(hierarchy_data["data"]["concepts"])
-        logger.info(f"Extracted occupation lists for {len(hierarchy_occupations_map)} SSYK codes from hierarchy")
+        logger.info("Extracted occupation lists for %d SSYK codes from hierarchy", len(hierarchy_occupations_map))
 
         # 3. Parse Skills to get related skills (and potentially other occupations, but we prioritize hierarchy)
-        skills_data = self.load_json("ssyk4_skills")
-        records = []
+        # Read columnar: the skill and occupation leaves stay in Arrow buffers
+        skills_concepts = self.load_concepts_table("ssyk4_skills")
         
-        for group in skills_data["data"]["concepts"]:
-            tid = group.get("id")
-            
-            # Base info
-            base_info = ssyk_map.get(tid)
-            if not base_info:
-                continue
-            
-            ssyk_code = base_info["ssyk_code"]
-                
-            # Extract Skills
-            skills = [
-                item["preferred_label"] 
-                for item in group.get("related", []) 
-                if item.get("type") == "skill"
-            ]
-            
-            # Extract Occupations from Skills file (as fallback or supplement)
-            occupations_from_skills = [
-                item["preferred_label"]
-                for item in group.get("narrower", [])
-                if item.get("type") == "occupation-name"
-            ]
-            
-            # Get Occupations from Hierarchy (Official List)
-            occupations_from_hierarchy = hierarchy_occupations_map.get(ssyk_code, [])
-            
-            # Combine unique occupations
-            all_occupations = list(set(occupations_from_skills + occupations_from_hierarchy))
-            
-            record = base_info.copy()
-            record["skills"] = skills
-            record["related_occupations"] = all_occupations
-            records.append(record)
-            
-        df = pd.DataFrame(records)
-        logger.info(f"Processed {len(df)} enriched SSYK records")
+        # Long (taxonomy_id, label) tables, collapsed to one list per group
+        skills_by_tid = self._labels_by_taxonomy_id(skills_concepts, "related", "skill")
+        # Occupations from the skills file, as fallback or supplement
+        occupations_by_tid = self._labels_by_taxonomy_id(skills_concepts, "narrower", "occupation-name")
+        
+        # One row per skills-file group that has base info, in file order
+        base_df = pd.DataFrame.from_records(
+            list(ssyk_map.values()),
+            columns=["ssyk_code", "ssyk_name", "ssyk_definition", "occupation_field", "taxonomy_id"],
+        )
+        group_ids = pd.DataFrame({"taxonomy_id": skills_concepts.field("id").to_pandas()})
+        df = group_ids.merge(base_df, on="taxonomy_id", how="inner")[base_df.columns]
+        
+        skills = df["taxonomy_id"].map(skills_by_tid)
+        occupations_from_skills = df["taxonomy_id"].map(occupations_by_tid)
+        # Occupations from the hierarchy (official list)
+        occupations_from_hierarchy = df["ssyk_code"].map(hierarchy_occupations_map)
+        
+        df["skills"] = [s if isinstance(s, list) else [] for s in skills]
+        # Combine unique occupations, keeping first-seen order so the output is
+        # reproducible
+        df["related_occupations"] = [
+            list(dict.fromkeys((a if isinstance(a, list) else []) + (b if isinstance(b, list) else [])))
+            for a, b in zip(occupations_from_skills, occupations_from_hierarchy)
+        ]
+        logger.info("Processed %d enriched SSYK records", len(df))
         
         return df
 
+    @staticmethod
+    def _labels_by_taxonomy_id(concepts: pa.StructArray, key: str, item_type: str) -> pd.Series:
+        """Collects the labels of each group's ``key`` items of ``item_type`` into a list per taxonomy id."""
+        if concepts.type.get_field_index(key) == -1:
+            return pd.Series(dtype=object)
+        
+        # Flatten the per-group item lists, remembering which group each came from
+        items = concepts.field(key)
+        parents = pc.list_parent_indices(items)
+        flat = pc.list_flatten(items)
+        mask = pc.equal(flat.field("type"), item_type)
+        
+        pairs = pd.DataFrame({
+            "taxonomy_id": pc.take(concepts.field("id"), parents).filter(mask).to_pandas(),
+            "label": flat.field("preferred_label").filter(mask).to_pandas(),
+        })
+        return pairs.groupby("taxonomy_id", sort=False)["label"].agg(list)
+
     def save_processed(self, df: pd.DataFrame, output_dir: Path) -> Path:
         output_path = output_dir / "taxonomy_enriched.parquet"
         
@@ -150,6 +211,18 @@ class TaxonomyIngestion:
         # PyArrow handles lists fine, but let's be explicit if needed.
         # Actually pandas to_parquet handles basic lists.
         
-        df.to_parquet(output_path, index=False)
-        logger.info(f"Saved enriched taxonomy to {output_path}")
+        # Only a few dozen occupation fields are shared by every SSYK group
+        if "occupation_field" in df.columns:
+            df = df.astype({"occupation_field": "category"})
+        df.to_parquet(output_path, index=False, **PARQUET_WRITE_OPTIONS)
+        logger.info("Saved enriched taxonomy to %s", output_path)
         return output_path
+
+    def close(self):
+        self.client.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
@@ -3,13 +3,133 @@
 Handles transformation, cleaning, and aggregation of labor market data.
 """
 
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Optional
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from data_pipeline.utils.parquet import PARQUET_ROW_GROUP_SIZE, PARQUET_WRITE_OPTIONS
 
 logger = logging.getLogger(__name__)
 
+# SCB gender codes
+GENDER_LABELS = {"1": "men", "2": "women", "1+2": "total"}
+
+# Low-cardinality code columns kept as categoricals: labels are then looked
+# up once per category, and groupby/pivot work on integer codes
+CATEGORICAL_CODE_COLUMNS = ["ssyk_code", "region", "region_code", "gender_code", "sector_code", "measure"]
+
+
+def _read_column(parquet_file: pq.ParquetFile, name: str) -> pa.ChunkedArray:
+    """Read a single column, decoding dictionary-encoded (categorical) data."""
+    column = parquet_file.read(columns=[name]).column(name)
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    return column
+
+
+def _is_numeric(data_type: pa.DataType) -> bool:
+    return pa.types.is_integer(data_type) or pa.types.is_floating(data_type)
+
+
+def _categorize_codes(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast the code columns present in ``df`` to categoricals."""
+    return df.astype({col: "category" for col in CATEGORICAL_CODE_COLUMNS if col in df.columns})
+
+
+def _parse_dates(dates: pd.Series) -> pd.Series:
+    """Parse ISO 8601 date strings, once per distinct string.
+
+    Many ads share a publication date, so parsing the unique strings and
+    mapping them back is much cheaper than parsing every row. Already
+    parsed columns are returned unchanged.
+    """
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates
+    codes, uniques = pd.factorize(dates)
+    parsed = pd.to_datetime(uniques, errors="coerce", format="ISO8601")
+    return pd.Series(parsed.take(codes, allow_fill=True, fill_value=pd.NaT), index=dates.index, name=dates.name)
+
+
+def _group_keys(df: pd.DataFrame, group_cols: List[str]) -> np.ndarray:
+    """Combine ``group_cols`` into one integer key per row.
+
+    Keys order like the sorted column values, and missing values get a key
+    of their own (sorted last), as with ``groupby(dropna=False)``.
+    """
+    codes = []
+    sizes = []
+    for col in group_cols:
+        col_codes, uniques = pd.factorize(df[col], sort=True, use_na_sentinel=False)
+        codes.append(col_codes)
+        sizes.append(len(uniques))
+    return np.ravel_multi_index(codes, sizes) if len(codes) > 1 else codes[0]
+
+
+def _group_ids(df: pd.DataFrame, group_cols: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Number the groups of ``df`` by ``group_cols`` in sorted key order.
+
+    Returns the group id of every row and the first row of every group.
+    """
+    _, first_rows, group_ids = np.unique(_group_keys(df, group_cols), return_index=True, return_inverse=True)
+    return group_ids, first_rows
+
+
+def _sort_groups(df: pd.DataFrame, group_cols: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Sort the rows of ``df`` into groups by ``group_cols``.
+
+    Returns the row order, which is stable within a group, and the position
+    in that order where each group starts.
+    """
+    keys = _group_keys(df, group_cols)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    return order, starts
+
+
+def _pivot_dense(df: pd.DataFrame, index: List[str], columns: str, values: str) -> Optional[pd.DataFrame]:
+    """Pivot ``df`` by writing its values straight into a 2-D array.
+
+    ``df`` must have at most one row per index and column value. Only
+    applies when the rows then form a complete grid (every index
+    combination has every column value) with no missing keys and the values
+    have a numeric NumPy dtype; returns None otherwise, so the caller can
+    fall back to ``DataFrame.pivot``. The result matches
+    ``df.pivot(...).reset_index()``, including the values' dtype.
+    """
+    values_dtype = df[values].dtype
+    if (
+        df[index + [columns]].isna().any(axis=None)
+        or not isinstance(values_dtype, np.dtype)
+        or not pd.api.types.is_numeric_dtype(values_dtype)
+    ):
+        return None
+    group_ids, first_rows = _group_ids(df, index)
+    column_codes, column_values = pd.factorize(df[columns], sort=True)
+    if len(df) != len(first_rows) * len(column_values):
+        return None
+
+    # The grid is complete, so every cell is written and no fill value (or
+    # upcast to hold one) is needed
+    grid = np.empty((len(first_rows), len(column_values)), dtype=values_dtype)
+    grid[group_ids, column_codes] = df[values].to_numpy()
+    return pd.concat([
+        df[index].iloc[first_rows].reset_index(drop=True),
+        pd.DataFrame(grid, columns=list(column_values)),
+    ], axis=1)
+
+
+def _gender_labels(gender_codes: pd.Series) -> pd.Series:
+    """Map SCB gender codes to labels, once per distinct code."""
+    return gender_codes.astype("category").map(GENDER_LABELS)
+
+
 class DataProcessor:
     """Process and combine data from multiple sources."""
     
@@ -40,9 +160,10 @@ class DataProcessor:
         Returns:
             Processed DataFrame in tidy format
         """
-        logger.info(f"Processing {len(df)} income records")
+        logger.info("Processing %d income records", len(df))
         
-        df = df.copy()
+        # Shallow copy: new columns are added to this frame, not the caller's
+        df = df.copy(deep=False)
         
         # Standardize column names
         column_mapping = {
@@ -54,9 +175,7 @@ class DataProcessor:
             "value": "value",
         }
         
-        for old_name, new_name in column_mapping.items():
-            if old_name in df.columns:
-                df = df.rename(columns={old_name: new_name})
+        df = df.rename(columns={old: new for old, new in column_mapping.items() if old in df.columns})
         
         # Ensure occupation label exists
         if "occupation_name" in df.columns:
@@ -75,6 +194,8 @@ class DataProcessor:
              logger.warning("Measure column missing, raw codes might be used")
              df["measure"] = df.get("measure_code", df.get("ContentsCode"))
 
+        df = _categorize_codes(df)
+        
         # Create wide format for common use cases
         # We want columns: year, region, occupation, gender, monthly_salary, num_employees
         if "measure" in df.columns and "value" in df.columns:
@@ -83,26 +204,35 @@ class DataProcessor:
                                        "occupation", "gender_code", "gender", "sector_name", "sector"] 
                            if c in df.columns]
                 
-                # Check duplicates before pivoting
-                if df.duplicated(subset=id_cols + ["measure"]).any():
+                # Only the pivot inputs are needed from here on
+                df_pivot = df[id_cols + ["measure", "value"]]
+                
+                # Check duplicates before pivoting; once they are dropped a plain
+                # pivot (reshape only) replaces pivot_table's groupby
+                duplicated = df_pivot.duplicated(subset=id_cols + ["measure"])
+                if duplicated.any():
                     logger.warning("Duplicates found in income data, taking first")
+                    df_pivot = df_pivot[~duplicated]
                 
-                df_wide = df.pivot_table(
-                    index=id_cols,
-                    columns="measure",
-                    values="value",
-                    aggfunc="first"
-                ).reset_index()
+                # SCB tables are usually complete grids of ids x measures, which
+                # need no reshaping machinery at all
+                df_wide = _pivot_dense(df_pivot, id_cols, "measure", "value")
+                if df_wide is None:
+                    df_wide = df_pivot.pivot(
+                        index=id_cols,
+                        columns="measure",
+                        values="value",
+                    ).reset_index()
                 
                 # Cleanup column names (remove name of index)
                 df_wide.columns.name = None
                 
-                logger.info(f"Created wide format with {len(df_wide)} records")
+                logger.info("Created wide format with %d records", len(df_wide))
                 return df_wide
              except Exception as e:
-                logger.warning(f"Could not pivot to wide format: {e}")
+                logger.warning("Could not pivot to wide format: %s", e)
         
-        logger.info(f"Processed {len(df)} income records (long format)")
+        logger.info("Processed %d income records (long format)", len(df))
         return df
     
     def process_jobs_data(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -114,24 +244,35 @@ class DataProcessor:
         Returns:
             Processed DataFrame
         """
-        logger.info(f"Processing {len(df)} job ad records")
+        logger.info("Processing %d job ad records", len(df))
         
-        df = df.copy()
+        df = df.copy(deep=False)
         
         # Convert dates
         if "published_date" in df.columns:
-            df["published_date"] = pd.to_datetime(df["published_date"], errors="coerce")
-            df["year"] = df["published_date"].dt.year
-            df["month"] = df["published_date"].dt.month
-            df["year_month"] = df["published_date"].dt.to_period("M").astype(str)
+            df["published_date"] = _parse_dates(df["published_date"])
+            # Extract the date parts with Arrow kernels, including a C strftime
+            # instead of pandas' per-element one. Missing dates keep the
+            # "NaT" year_month that Period formatting gives.
+            dates = pa.array(df["published_date"])
+            df["year"] = pc.year(dates).to_numpy(zero_copy_only=False)
+            df["month"] = pc.month(dates).to_numpy(zero_copy_only=False)
+            df["year_month"] = pc.fill_null(pc.strftime(dates, "%Y-%m"), "NaT").to_numpy(zero_copy_only=False)
+        
+        df = _categorize_codes(df)
         
         # Clean vacancies
         if "number_of_vacancies" in df.columns:
-            df["number_of_vacancies"] = pd.to_numeric(
-                df["number_of_vacancies"], errors="coerce"
-            ).fillna(1).astype(int)
-        
-        logger.info(f"Processed {len(df)} job ad records")
+            vacancies = df["number_of_vacancies"]
+            # Ingestion already stores counts as numbers; only raw data needs coercing
+            if not pd.api.types.is_numeric_dtype(vacancies):
+                vacancies = pd.to_numeric(vacancies, errors="coerce")
+            # Missing counts become one vacancy
+            df["number_of_vacancies"] = np.nan_to_num(
+                vacancies.to_numpy(dtype="float64", na_value=np.nan), nan=1.0
+            ).astype(int)
+        
+        logger.info("Processed %d job ad records", len(df))
         return df
     
     def aggregate_jobs_by_region(
@@ -158,25 +299,29 @@ class DataProcessor:
             logger.warning("No valid group columns found")
             return df
         
-        agg = df.groupby(group_cols, dropna=False).agg({
-            "id": "count",
-            "number_of_vacancies": "sum",
-        }).reset_index()
+        # Sort the rows into groups once, then sum each contiguous run: sequential
+        # scans stay cache-friendly however many region/occupation/period groups there are
+        order, starts = _sort_groups(df, group_cols)
+        agg = df[group_cols].iloc[order[starts]].reset_index(drop=True)
+        agg["ad_count"] = np.add.reduceat(df["id"].notna().to_numpy(dtype="int64")[order], starts)
+        agg["total_vacancies"] = np.add.reduceat(df["number_of_vacancies"].to_numpy()[order], starts)
         
-        agg = agg.rename(columns={
-            "id": "ad_count",
-            "number_of_vacancies": "total_vacancies",
-        })
-        
-        logger.info(f"Aggregated to {len(agg)} records")
+        logger.info("Aggregated to %d records", len(agg))
         return agg
     
-    def create_summary_stats(self, income_df: pd.DataFrame, jobs_df: pd.DataFrame) -> Dict:
+    def create_summary_stats(
+        self,
+        income_path: Optional[Path],
+        jobs_path: Optional[Path],
+    ) -> Dict:
         """Create summary statistics for the dashboard.
         
+        Works on the saved Parquet files: record counts come from the file
+        footer and only the columns needed for the aggregates are read.
+        
         Args:
-            income_df: Processed income data
-            jobs_df: Processed job ads data
+            income_path: Path to processed income Parquet file
+            jobs_path: Path to processed job ads Parquet file
             
         Returns:
             Dictionary with summary statistics
@@ -187,34 +332,60 @@ class DataProcessor:
         }
         
         # Income stats
-        if not income_df.empty:
-            # Look for monthly_salary column (from pivot) OR 'value' if long format
-            salary_cols = ["monthly_salary", "avg_monthly_salary", "median_salary", "value"]
-            salary_col = next((c for c in salary_cols if c in income_df.columns), None)
+        if income_path is not None and Path(income_path).exists():
+            income_file = pq.ParquetFile(income_path)
+            income_schema = income_file.schema_arrow
             
-            if salary_col and pd.api.types.is_numeric_dtype(income_df[salary_col]):
-                stats["income"] = {
-                    "mean_salary": float(income_df[salary_col].mean()),
-                    "min_salary": float(income_df[salary_col].min()),
-                    "max_salary": float(income_df[salary_col].max()),
-                    "record_count": len(income_df),
-                }
-            
-            if "year" in income_df.columns:
-                stats["income"]["years"] = sorted(income_df["year"].dropna().unique().tolist())
+            if income_file.metadata.num_rows:
+                # Look for monthly_salary column (from pivot) OR 'value' if long format
+                salary_cols = ["monthly_salary", "avg_monthly_salary", "median_salary", "value"]
+                salary_col = next((c for c in salary_cols if c in income_schema.names), None)
+                
+                if salary_col and _is_numeric(income_schema.field(salary_col).type):
+                    salary = _read_column(income_file, salary_col)
+                    # min_max finds both extremes in one scan
+                    salary_range = pc.min_max(salary)
+                    stats["income"] = {
+                        "mean_salary": pc.mean(salary).as_py(),
+                        "min_salary": salary_range["min"].as_py(),
+                        "max_salary": salary_range["max"].as_py(),
+                        "record_count": income_file.metadata.num_rows,
+                    }
+                
+                if "year" in income_schema.names:
+                    years = pc.drop_null(pc.unique(_read_column(income_file, "year")))
+                    stats["income"]["years"] = sorted(years.to_pylist())
         
         # Jobs stats
-        if not jobs_df.empty:
-            stats["jobs"] = {
-                "total_ads": len(jobs_df),
-                "total_vacancies": int(jobs_df.get("number_of_vacancies", pd.Series([0])).sum()),
-                "unique_employers": int(jobs_df.get("employer_name", pd.Series()).nunique()),
-            }
+        if jobs_path is not None and Path(jobs_path).exists():
+            jobs_file = pq.ParquetFile(jobs_path)
+            jobs_columns = jobs_file.schema_arrow.names
             
-            if "region" in jobs_df.columns:
-                stats["jobs"]["top_regions"] = (
-                    jobs_df["region"].value_counts().head(5).to_dict()
-                )
+            if jobs_file.metadata.num_rows:
+                total_vacancies = 0
+                if "number_of_vacancies" in jobs_columns:
+                    total_vacancies = pc.sum(_read_column(jobs_file, "number_of_vacancies")).as_py() or 0
+                
+                unique_employers = 0
+                if "employer_name" in jobs_columns:
+                    unique_employers = pc.count_distinct(_read_column(jobs_file, "employer_name")).as_py()
+                
+                stats["jobs"] = {
+                    "total_ads": jobs_file.metadata.num_rows,
+                    "total_vacancies": int(total_vacancies),
+                    "unique_employers": int(unique_employers),
+                }
+                
+                if "region" in jobs_columns:
+                    counts = pc.value_counts(pc.drop_null(_read_column(jobs_file, "region")))
+                    # Partial top-k selection instead of sorting every region's count
+                    top = counts.take(pc.select_k_unstable(
+                        pa.RecordBatch.from_struct_array(counts), k=5, sort_keys=[("counts", "descending")]
+                    ))
+                    stats["jobs"]["top_regions"] = dict(zip(
+                        top.field("values").to_pylist(),
+                        top.field("counts").to_pylist(),
+                    ))
         
         return stats
     
@@ -230,9 +401,9 @@ class DataProcessor:
         Returns:
             Processed DataFrame with percentile columns
         """
-        logger.info(f"Processing {len(df)} dispersion records")
+        logger.info("Processing %d dispersion records", len(df))
         
-        df = df.copy()
+        df = df.copy(deep=False)
         
         # Standardize column names
         column_mapping = {
@@ -242,20 +413,21 @@ class DataProcessor:
             "Sektor": "sector_code",
         }
         
-        for old_name, new_name in column_mapping.items():
-            if old_name in df.columns and new_name not in df.columns:
-                df = df.rename(columns={old_name: new_name})
+        df = df.rename(columns={
+            old: new for old, new in column_mapping.items() if old in df.columns and new not in df.columns
+        })
         
         if "occupation_name" in df.columns:
             df["occupation"] = df["occupation_name"]
 
+        df = _categorize_codes(df)
+
         # Standardize gender column
         if "gender" not in df.columns:
             if "gender_code" in df.columns:
-                gender_map = {"1": "men", "2": "women", "1+2": "total"}
-                df["gender"] = df["gender_code"].map(gender_map)
+                df["gender"] = _gender_labels(df["gender_code"])
         
-        logger.info(f"Processed {len(df)} dispersion records")
+        logger.info("Processed %d dispersion records", len(df))
         
         return df
 
@@ -264,8 +436,8 @@ class DataProcessor:
         if df.empty:
             return df
         
-        logger.info(f"Processing {len(df)} income by age records")
-        df = df.copy()
+        logger.info("Processing %d income by age records", len(df))
+        df = df.copy(deep=False)
         
         column_mapping = {
             "Tid": "year", 
@@ -275,17 +447,16 @@ class DataProcessor:
             "value": "monthly_salary",
             "Sektor": "sector_code"
         }
-        for old, new in column_mapping.items():
-            if old in df.columns:
-                df = df.rename(columns={old: new})
+        df = df.rename(columns={old: new for old, new in column_mapping.items() if old in df.columns})
         
         if "occupation_name" in df.columns:
             df["occupation"] = df["occupation_name"]
 
+        df = _categorize_codes(df)
+
         # Standardize gender
         if "gender" not in df.columns and "gender_code" in df.columns:
-            gender_map = {"1": "men", "2": "women", "1+2": "total"}
-            df["gender"] = df["gender_code"].map(gender_map)
+            df["gender"] = _gender_labels(df["gender_code"])
             
         return df
 
@@ -294,8 +465,8 @@ class DataProcessor:
         if df.empty:
             return df
             
-        logger.info(f"Processing {len(df)} income by education records")
-        df = df.copy()
+        logger.info("Processing %d income by education records", len(df))
+        df = df.copy(deep=False)
         
         column_mapping = {
             "Tid": "year", 
@@ -305,16 +476,14 @@ class DataProcessor:
             "value": "monthly_salary",
             "Sektor": "sector_code"
         }
-        for old, new in column_mapping.items():
-            if old in df.columns:
-                df = df.rename(columns={old: new})
+        df = df.rename(columns={old: new for old, new in column_mapping.items() if old in df.columns})
                 
         if "occupation_name" in df.columns:
             df["occupation"] = df["occupation_name"]
 
+        df = _categorize_codes(df)
         if "gender" not in df.columns and "gender_code" in df.columns:
-            gender_map = {"1": "men", "2": "women", "1+2": "total"}
-            df["gender"] = df["gender_code"].map(gender_map)
+            df["gender"] = _gender_labels(df["gender_code"])
             
         return df
     
@@ -354,11 +523,27 @@ class DataProcessor:
             "income_by_education": education_df,
         }
         
-        for name, df in files.items():
-            if df is not None and not df.empty:
-                filepath = self.processed_dir / f"{name}.parquet"
-                df.to_parquet(filepath, index=False, engine="pyarrow")
-                paths[name] = filepath
-                logger.info(f"Saved {name} to {filepath}")
+        files = {name: df for name, df in files.items() if df is not None and not df.empty}
+        
+        # The files are independent and pyarrow releases the GIL while
+        # encoding and writing, so write them concurrently
+        with ThreadPoolExecutor(max_workers=max(len(files), 1)) as executor:
+            futures = {
+                name: executor.submit(
+                    df.to_parquet,
+                    self.processed_dir / f"{name}.parquet",
+                    index=False,
+                    engine="pyarrow",
+                    row_group_size=PARQUET_ROW_GROUP_SIZE,
+                    **PARQUET_WRITE_OPTIONS,
+                )
+                for name, df in files.items()
+            }
+        
+        for name, future in futures.items():
+            # Raises here if the write failed
+            future.result()
+            paths[name] = self.processed_dir / f"{name}.parquet"
+            logger.info("Saved %s to %s", name, paths[name])
         
         return paths
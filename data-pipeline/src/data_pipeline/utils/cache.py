@@ -0,0 +1,47 @@
+"""On-disk memoization for slow, rarely changing DataFrame sources."""
+
+import functools
+import hashlib
+import logging
+import time
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def disk_cache(ttl_days: float = 30):
+    """Cache a DataFrame-returning method as Parquet under ``self._cache_dir``.
+
+    Entries are keyed on the method name, its arguments and the current month,
+    and are refetched once older than ``ttl_days``. Instances should set
+    ``_cache_dir`` to an absolute path (e.g. under the raw data directory), so
+    the cache does not depend on the working directory.
+
+    Args:
+        ttl_days: Maximum age of a cache entry in days
+
+    Returns:
+        Method decorator
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key_source = repr((func.__qualname__, args, sorted(kwargs.items()), date.today().strftime("%Y-%m")))
+            key = hashlib.sha256(key_source.encode()).hexdigest()[:16]
+            path = Path(self._cache_dir) / f"{func.__name__}_{key}.parquet"
+
+            if path.exists() and time.time() - path.stat().st_mtime < ttl_days * 86400:
+                logger.debug("Loading %s from cache %s", func.__qualname__, path)
+                return pd.read_parquet(path)
+
+            df = func(self, *args, **kwargs)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            df.to_parquet(path, index=False)
+            return df
+
+        return wrapper
+
+    return decorator
@@ -1,5 +1,6 @@
 """Configuration utilities."""
 
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -23,9 +24,13 @@ class Settings(BaseSettings):
         env_file_encoding = "utf-8"
 
 
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
     """Get application settings.
     
+    The settings are read from the environment and ``.env`` once and the
+    same instance is returned on later calls.
+    
     Returns:
         Settings instance
     """
@@ -0,0 +1,276 @@
+"""HTTP helpers shared by the ingestion clients."""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Deque, Dict, Optional, Union
+
+import httpx
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Keep-alive pool for the long sequences of requests sent to the same host.
+# The 75s expiry matches the nginx default so idle sockets are reused rather
+# than closed server-side between bursts.
+CONNECTION_LIMITS = httpx.Limits(
+    max_keepalive_connections=20,
+    max_connections=100,
+    keepalive_expiry=75.0,
+)
+
+
+def create_client() -> httpx.Client:
+    """Create a pooled HTTP/2 client for the JobTech APIs.
+
+    A single client can be shared by every API wrapper (and thread) talking
+    to ``*.jobtechdev.se``, so connections are reused across them. Timeouts
+    are set per request by the caller.
+    """
+    return httpx.Client(
+        headers={
+            "Accept": "application/json",
+            "User-Agent": "SwedishLaborMarketAnalytics/1.0",
+        },
+        transport=httpx.HTTPTransport(http2=True, limits=CONNECTION_LIMITS, retries=3),
+    )
+
+
+class TokenBucket:
+    """Token-bucket rate limiter.
+
+    Holds up to ``capacity`` tokens and refills at ``refill_rate`` tokens per
+    second. Each request takes one token, so idle time builds up credit for a
+    burst while the long-run rate never exceeds ``refill_rate``. Safe to share
+    between threads.
+    """
+
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.base_refill_rate = refill_rate
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        # When a rate taken from response headers lapses back to the base rate
+        self._rate_expires: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+        if self._rate_expires is not None and now >= self._rate_expires:
+            self.refill_rate = self.base_refill_rate
+            self._rate_expires = None
+
+    def acquire(self, tokens: float = 1.0):
+        """Take tokens from the bucket, sleeping until they are available."""
+        with self._lock:
+            self._refill()
+            # Reserve the tokens now; a negative balance is paid off by sleeping
+            self.tokens -= tokens
+            wait = -self.tokens / self.refill_rate if self.tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def update_from_headers(self, headers: httpx.Headers):
+        """Adapt to the quota the server advertises, if it sends one.
+
+        ``X-RateLimit-Remaining`` caps the tokens on hand, and the refill rate
+        spreads that remaining quota over the time until ``X-RateLimit-Reset``,
+        never exceeding the base rate. An exhausted quota blocks callers until
+        the reset, after which the base rate applies again.
+        """
+        try:
+            remaining = float(headers["X-RateLimit-Remaining"])
+            reset = float(headers["X-RateLimit-Reset"])
+        except (KeyError, ValueError):
+            return
+
+        # Reset may be an epoch timestamp rather than seconds until reset
+        now = time.time()
+        if reset > now / 2:
+            reset -= now
+        reset = max(reset, 1e-3)
+
+        with self._lock:
+            self._refill()
+            if remaining > 0:
+                self.refill_rate = min(self.base_refill_rate, remaining / reset)
+                self._rate_expires = time.monotonic() + reset
+                self.tokens = min(self.tokens, remaining)
+            else:
+                self.tokens = min(self.tokens, -reset * self.refill_rate)
+
+    def penalize(self, tokens: float = 1.0):
+        """Drain tokens without sending a request, slowing every caller down."""
+        with self._lock:
+            self._refill()
+            self.tokens -= tokens
+
+
+class SlidingWindowLimiter:
+    """Sliding-window rate limiter.
+
+    Lets at most ``max_requests`` through in any ``window`` seconds, for APIs
+    whose quota is stated per window rather than as a steady rate. Unlike a
+    token bucket it never allows a full burst on top of the refill. Safe to
+    share between threads.
+    """
+
+    def __init__(self, max_requests: int, window: float):
+        self.max_requests = max_requests
+        self.window = window
+        self._sent: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """Wait until a request fits in the window, then record it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._sent and self._sent[0] <= now - self.window:
+                    self._sent.popleft()
+                if len(self._sent) < self.max_requests:
+                    self._sent.append(now)
+                    return
+                wait = self._sent[0] + self.window - now
+            time.sleep(wait)
+
+    def update_from_headers(self, headers: httpx.Headers):
+        """No-op; the window is fixed by the API's published quota."""
+
+    def penalize(self, tokens: float = 1.0):
+        """Use up a slot in the current window without sending a request."""
+        with self._lock:
+            self._sent.append(time.monotonic())
+
+
+class HostRateGate:
+    """Per-host request gate shared between API clients.
+
+    Requests to the same host are spaced at least ``min_interval`` seconds
+    apart and at most ``max_concurrent`` are in flight at once, whichever
+    client sends them. The spacing is retuned from the first
+    ``RateLimit-Policy`` header each host sends. Safe to share between threads.
+    """
+
+    def __init__(self, min_interval: float = 0.0, max_concurrent: int = 8):
+        self.min_interval = min_interval
+        self.max_concurrent = max_concurrent
+        self._intervals: Dict[str, float] = {}
+        self._next_slot: Dict[str, float] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, host: str):
+        """Hold a request slot for ``host``, waiting for its turn first."""
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.max_concurrent))
+
+        with semaphore:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_slot.get(host, now))
+                self._next_slot[host] = start + self._intervals.get(host, self.min_interval)
+
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+    def update_from_headers(self, host: str, headers: httpx.Headers):
+        """Set the host's spacing from its ``RateLimit-Policy`` header, once.
+
+        The policy has the form ``<quota>;w=<window seconds>``, e.g. ``10;w=1``.
+        """
+        if host in self._intervals or "RateLimit-Policy" not in headers:
+            return
+
+        quota, _, params = headers["RateLimit-Policy"].split(",")[0].partition(";")
+        try:
+            window = 1.0
+            for param in params.split(";"):
+                key, _, value = param.strip().partition("=")
+                if key == "w":
+                    window = float(value)
+            requests_per_second = float(quota) / window
+        except (ValueError, ZeroDivisionError):
+            # Malformed policy, e.g. "10;w=abc"; keep the default spacing
+            return
+        if requests_per_second > 0:
+            with self._lock:
+                self._intervals[host] = 1.0 / requests_per_second
+
+
+def read_json(response: httpx.Response):
+    """Parse a JSON response body with orjson.
+
+    Faster than ``response.json()`` for the large paginated API payloads.
+    """
+    return orjson.loads(response.content)
+
+
+def request_with_retry(
+    client: httpx.Client,
+    method: str,
+    url: str,
+    bucket: Optional[Union[TokenBucket, SlidingWindowLimiter]] = None,
+    gate: Optional[HostRateGate] = None,
+    attempts: int = 5,
+    **kwargs,
+) -> httpx.Response:
+    """Send a request, retrying rate-limited and transient server errors.
+
+    Waits for ``Retry-After`` when the server sends it, otherwise backs off
+    exponentially with jitter. Each retry also penalizes the token bucket so
+    concurrent callers slow down together, and rate-limit headers on every
+    response retune the bucket.
+
+    Args:
+        client: Client to send the request with
+        method: HTTP method
+        url: Request URL
+        bucket: Rate limiter to acquire a token from before every attempt
+        gate: Per-host gate to pass through before every attempt
+        attempts: Maximum number of attempts
+        **kwargs: Passed through to ``client.request``
+
+    Returns:
+        The last response received; callers still check its status
+    """
+    host = httpx.URL(url).host
+    for attempt in range(attempts):
+        if bucket is not None:
+            bucket.acquire()
+
+        with gate.slot(host) if gate is not None else nullcontext():
+            response = client.request(method, url, **kwargs)
+        if bucket is not None:
+            bucket.update_from_headers(response.headers)
+        if gate is not None:
+            gate.update_from_headers(host, response.headers)
+        if response.status_code not in RETRY_STATUS_CODES or attempt == attempts - 1:
+            return response
+
+        delay = _retry_delay(response, attempt)
+        logger.warning("%s %s returned %s, retrying in %.1fs", method, url, response.status_code, delay)
+        if bucket is not None:
+            bucket.penalize()
+        time.sleep(delay)
+
+
+def _retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying, from Retry-After or exponential backoff."""
+    try:
+        delay = float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        delay = 2.0 ** attempt
+    return delay + random.uniform(0, 0.5)
@@ -0,0 +1,12 @@
+"""Parquet encoding shared by the pipeline's writers."""
+
+# zstd-3 compresses about 2x better than snappy at similar speed, and repeated
+# strings are dictionary-encoded. Accepted by pq.write_table, pq.ParquetWriter
+# and DataFrame.to_parquet alike.
+PARQUET_WRITE_OPTIONS = {
+    "compression": "zstd",
+    "compression_level": 3,
+    "use_dictionary": True,
+    "data_page_size": 1024 * 1024,
+}
+PARQUET_ROW_GROUP_SIZE = 64_000
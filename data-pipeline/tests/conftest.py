@@ -0,0 +1,7 @@
+"""Shared pytest setup for the pipeline tests."""
+
+import sys
+from pathlib import Path
+
+# Make the data_pipeline package importable without installing it
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
@@ -0,0 +1,169 @@
+"""Tests for the Arbetsförmedlingen fetch helpers."""
+
+from datetime import datetime
+
+import logging
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from data_pipeline.ingestion.arbetsformedlingen_ingestion import (
+    ArbetsformedlingenIngestion,
+    EnrichmentsClient,
+    HistoricalAdsClient,
+)
+
+month_windows = ArbetsformedlingenIngestion._month_windows
+
+
+@pytest.fixture
+def historical_client():
+    """HistoricalAdsClient whose search serves ``total`` ads in every window."""
+    client = HistoricalAdsClient()
+    client.total = 0
+    client.windows = []
+
+    def search(ssyk_code, published_after, published_before, offset, limit):
+        if offset == 0:
+            client.windows.append((published_after, published_before))
+        count = max(0, min(limit, client.total - offset))
+        hits = [{"id": f"{published_after}/{offset + i}"} for i in range(count)]
+        return {"total": {"value": client.total}, "hits": hits}
+
+    client.search = search
+    yield client
+    client.close()
+
+
+def test_month_windows_split_on_calendar_months_most_recent_first():
+    assert month_windows("2024-01-15T08:30:00", "2024-03-10T00:00:00") == [
+        ("2024-03-01T00:00:00", "2024-03-10T00:00:00"),
+        ("2024-02-01T00:00:00", "2024-03-01T00:00:00"),
+        ("2024-01-15T08:30:00", "2024-02-01T00:00:00"),
+    ]
+
+
+def test_month_windows_cross_the_year_boundary():
+    assert month_windows("2023-12-31T00:00:00", "2024-01-02T00:00:00") == [
+        ("2024-01-01T00:00:00", "2024-01-02T00:00:00"),
+        ("2023-12-31T00:00:00", "2024-01-01T00:00:00"),
+    ]
+
+
+def test_month_windows_within_one_month():
+    assert month_windows("2024-02-03T00:00:00", "2024-02-20T12:00:00") == [
+        ("2024-02-03T00:00:00", "2024-02-20T12:00:00"),
+    ]
+
+
+def test_month_windows_ending_on_a_month_start():
+    assert month_windows("2024-01-01T00:00:00", "2024-02-01T00:00:00") == [
+        ("2024-01-01T00:00:00", "2024-02-01T00:00:00"),
+    ]
+
+
+@pytest.mark.parametrize("start, end", [
+    ("2024-02-01T00:00:00", "2024-02-01T00:00:00"),
+    ("2024-03-01T00:00:00", "2024-02-01T00:00:00"),
+])
+def test_month_windows_empty_range(start, end):
+    assert month_windows(start, end) == []
+
+
+def test_month_windows_tile_the_range():
+    start, end = "2022-01-31T12:00:00", "2024-06-15T00:00:00"
+    windows = month_windows(start, end)[::-1]
+    assert len(windows) == 30
+    assert windows[0][0] == start
+    assert windows[-1][1] == end
+    for (_, previous_end), (next_start, _) in zip(windows, windows[1:]):
+        assert previous_end == next_start
+    # Every window but the last ends at the start of the next month
+    for _, window_end in windows[:-1]:
+        window_end = datetime.fromisoformat(window_end)
+        assert (window_end.day, window_end.hour, window_end.minute) == (1, 0, 0)
+
+
+def test_fetch_window_does_not_split_when_few_ads_are_wanted(historical_client):
+    historical_client.total = 50_000
+    ads = list(historical_client.fetch_ads_for_period("2512", "2024-01-01T00:00:00", "2024-02-01T00:00:00", 250))
+    assert len(ads) == 250
+    assert historical_client.windows == [("2024-01-01T00:00:00", "2024-02-01T00:00:00")]
+
+
+def test_fetch_window_splits_deep_windows_latest_half_first(historical_client):
+    historical_client.total = 2500
+    ads = list(historical_client.fetch_ads_for_period("2512", "2024-01-01T00:00:00", "2024-01-01T04:00:00", 3000))
+    assert historical_client.windows[:3] == [
+        ("2024-01-01T00:00:00", "2024-01-01T04:00:00"),
+        ("2024-01-01T02:00:00", "2024-01-01T04:00:00"),
+        ("2024-01-01T03:00:00", "2024-01-01T04:00:00"),
+    ]
+    assert len(ads) == 3000
+
+
+def test_fetch_window_warns_about_ads_past_the_deepest_offset(historical_client, caplog):
+    historical_client.total = 2500
+    with caplog.at_level(logging.WARNING):
+        ads = list(historical_client.fetch_ads_for_period("2512", "2024-01-01T00:00:00", "2024-01-01T01:00:00", 5000))
+    assert len(ads) == HistoricalAdsClient.MAX_OFFSET + 100
+    assert "dropping 400" in caplog.text
+
+
+def test_streamed_and_in_memory_fetches_write_the_same_file(tmp_path):
+    ad = {
+        "headline": "Developer",
+        "occupation": {"label": "Mjukvaruutvecklare"},
+        "workplace_address": {"region": "Skåne", "municipality": "Lund", "coordinates": [13.19, 55.70]},
+        "publication_date": "2024-01-10T08:00:00",
+        "number_of_vacancies": 2,
+        "description": {"text": "Write code."},
+    }
+    # The same ad shows up twice within 2512 and once more under 2511
+    hits = {"2512": [dict(ad, id="a"), dict(ad, id="a"), dict(ad, id="b")], "2511": [dict(ad, id="a")]}
+
+    ingestion = ArbetsformedlingenIngestion(raw_dir=tmp_path)
+    ingestion.historical_client.search = lambda ssyk_code, offset, **kwargs: {
+        "total": {"value": len(hits[ssyk_code])},
+        "hits": hits[ssyk_code] if offset == 0 else [],
+    }
+    fetch_args = {
+        "ssyk_codes": ["2512", "2511"],
+        "start_date": "2024-01-01T00:00:00",
+        "end_date": "2024-01-31T00:00:00",
+    }
+    try:
+        ingestion.save_to_parquet(ingestion.fetch_historical_ads(**fetch_args), tmp_path / "in_memory.parquet")
+        written = ingestion.fetch_historical_ads_to_parquet(tmp_path / "streamed.parquet", **fetch_args)
+    finally:
+        ingestion.close()
+
+    in_memory = pq.read_table(tmp_path / "in_memory.parquet")
+    streamed = pq.read_table(tmp_path / "streamed.parquet")
+    assert written == len(in_memory) == 3
+    assert streamed.schema.remove_metadata() == in_memory.schema.remove_metadata()
+    assert streamed.to_pylist() == in_memory.to_pylist()
+
+
+@pytest.mark.parametrize("dtype", [object, "string[pyarrow]"])
+def test_enrich_batch_sends_only_long_string_descriptions(dtype):
+    long_text = "x" * 60
+    descriptions = [long_text, None, "too short", long_text]
+    if dtype is object:
+        descriptions += [b"y" * 60, 12345]
+    ads = pd.DataFrame({
+        "id": range(len(descriptions)),
+        "description_text": pd.Series(descriptions, dtype=dtype),
+    })
+    sent = []
+    client = EnrichmentsClient()
+    client.enrich_documents = lambda documents, threshold: sent.extend(documents) or []
+    try:
+        skills = client.enrich_batch(ads)
+    finally:
+        client.close()
+    # Both long ads share one description, so it is sent once
+    assert [document["doc_text"] for document in sent] == [long_text]
+    # The short and non-text ads are done; the sent ones got no response
+    assert skills.attrs["enriched_ad_ids"] == {str(i) for i in range(1, len(descriptions)) if i != 3}
@@ -0,0 +1,177 @@
+"""Tests for the group-by and pivot helpers in DataProcessor, against pandas."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_pipeline.processing.data_processor import (
+    DataProcessor,
+    _group_ids,
+    _group_keys,
+    _pivot_dense,
+    _sort_groups,
+)
+
+
+def baseline_aggregate(df: pd.DataFrame, group_cols) -> pd.DataFrame:
+    """The groupby aggregate_jobs_by_region used to run."""
+    agg = df.groupby(group_cols, dropna=False, observed=True).agg({
+        "id": "count",
+        "number_of_vacancies": "sum",
+    }).reset_index()
+    return agg.rename(columns={"id": "ad_count", "number_of_vacancies": "total_vacancies"})
+
+
+def baseline_pivot(df: pd.DataFrame, index, columns, values) -> pd.DataFrame:
+    wide = df.pivot(index=index, columns=columns, values=values).reset_index()
+    wide.columns.name = None
+    return wide
+
+
+@pytest.fixture
+def processor(tmp_path):
+    return DataProcessor(data_dir=tmp_path)
+
+
+@pytest.fixture
+def jobs():
+    return pd.DataFrame({
+        "id": ["1", "2", "3", "4", None, "6", "7"],
+        "year": [2024.0, 2023.0, 2024.0, np.nan, 2023.0, 2024.0, 2023.0],
+        "region": ["Skåne", "Stockholm", "Skåne", "Skåne", "Stockholm", None, "Stockholm"],
+        "ssyk_code": ["2512", "2511", "2512", "2511", "2511", "2512", "2512"],
+        "number_of_vacancies": [1, 2, 3, 4, 5, 6, 7],
+    })
+
+
+# _group_keys / _group_ids / _sort_groups
+
+def test_group_ids_match_groupby_ngroup(jobs):
+    group_cols = ["year", "region", "ssyk_code"]
+    group_ids, first_rows = _group_ids(jobs, group_cols)
+    expected = jobs.groupby(group_cols, dropna=False).ngroup().to_numpy()
+    np.testing.assert_array_equal(group_ids, expected)
+    # The first row of each group carries that group's id
+    np.testing.assert_array_equal(group_ids[first_rows], np.arange(len(first_rows)))
+
+
+def test_group_keys_sort_missing_values_last():
+    df = pd.DataFrame({"a": ["b", None, "a"]})
+    keys = _group_keys(df, ["a"])
+    assert list(np.argsort(keys)) == [2, 0, 1]
+
+
+def test_sort_groups_orders_rows_stably_by_group(jobs):
+    group_cols = ["region", "ssyk_code"]
+    order, starts = _sort_groups(jobs, group_cols)
+    expected_groups = jobs.groupby(group_cols, dropna=False, sort=True).indices
+    runs = np.split(order, starts[1:])
+    assert [list(run) for run in runs] == [list(rows) for rows in expected_groups.values()]
+
+
+def test_sort_groups_single_group():
+    df = pd.DataFrame({"a": ["x", "x", "x"]})
+    order, starts = _sort_groups(df, ["a"])
+    assert list(order) == [0, 1, 2]
+    assert list(starts) == [0]
+
+
+# aggregate_jobs_by_region
+
+@pytest.mark.parametrize("period", ["year", "month"])
+def test_aggregate_jobs_by_region_matches_groupby(processor, jobs, period):
+    result = processor.aggregate_jobs_by_region(jobs, period=period)
+    group_cols = [c for c in [period, "region", "ssyk_code"] if c in jobs.columns]
+    pd.testing.assert_frame_equal(result, baseline_aggregate(jobs, group_cols))
+
+
+def test_aggregate_jobs_by_region_matches_groupby_on_categoricals(processor, jobs):
+    categorical = jobs.astype({"region": "category", "ssyk_code": "category"})
+    result = processor.aggregate_jobs_by_region(categorical)
+    expected = baseline_aggregate(categorical, ["year", "region", "ssyk_code"])
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_aggregate_jobs_by_region_single_group(processor, jobs):
+    single = jobs.assign(year=2024.0, region="Skåne", ssyk_code="2512")
+    result = processor.aggregate_jobs_by_region(single)
+    pd.testing.assert_frame_equal(result, baseline_aggregate(single, ["year", "region", "ssyk_code"]))
+    assert result["ad_count"].tolist() == [6]
+    assert result["total_vacancies"].tolist() == [28]
+
+
+def test_aggregate_jobs_by_region_empty(processor, jobs):
+    empty = jobs.iloc[:0]
+    assert processor.aggregate_jobs_by_region(empty).empty
+
+
+def test_aggregate_jobs_by_region_processed_ads(processor):
+    raw = pd.DataFrame({
+        "id": ["1", "2", "3", "4"],
+        "published_date": ["2024-01-05T10:00:00", "2024-02-01T00:00:00", None, "2023-12-31T23:00:00"],
+        "region": ["Skåne", "Skåne", "Stockholm", None],
+        "ssyk_code": ["2512", "2512", "2511", "2511"],
+        "number_of_vacancies": [1, None, "3", 2],
+    })
+    jobs = processor.process_jobs_data(raw)
+    for period in ["year", "year_month"]:
+        result = processor.aggregate_jobs_by_region(jobs, period=period)
+        pd.testing.assert_frame_equal(result, baseline_aggregate(jobs, [period, "region", "ssyk_code"]))
+
+
+# _pivot_dense
+
+@pytest.fixture
+def income_long():
+    years = ["2022", "2023"]
+    regions = ["01", "12", "03"]
+    measures = ["num_employees", "monthly_salary"]
+    rows = [(y, r, m) for y in years for r in regions for m in measures]
+    df = pd.DataFrame(rows, columns=["year", "region_code", "measure"])
+    df["value"] = np.arange(len(df), dtype="float64") * 100
+    # Shuffle so the pivot cannot rely on input order
+    return df.sample(frac=1.0, random_state=0).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("dtype", ["int64", "float32", "float64"])
+def test_pivot_dense_matches_pivot(income_long, dtype):
+    df = income_long.astype({"value": dtype})
+    result = _pivot_dense(df, ["year", "region_code"], "measure", "value")
+    expected = baseline_pivot(df, ["year", "region_code"], "measure", "value")
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_pivot_dense_keeps_missing_values(income_long):
+    df = income_long.copy()
+    df.loc[3, "value"] = np.nan
+    result = _pivot_dense(df, ["year", "region_code"], "measure", "value")
+    pd.testing.assert_frame_equal(result, baseline_pivot(df, ["year", "region_code"], "measure", "value"))
+
+
+def test_pivot_dense_matches_pivot_on_categoricals(income_long):
+    df = income_long.astype({"region_code": "category", "measure": "category"})
+    result = _pivot_dense(df, ["year", "region_code"], "measure", "value")
+    expected = baseline_pivot(df, ["year", "region_code"], "measure", "value")
+    pd.testing.assert_frame_equal(result, expected, check_column_type=False)
+
+
+def test_pivot_dense_single_cell():
+    df = pd.DataFrame({"year": ["2023"], "measure": ["monthly_salary"], "value": [42000.0]})
+    result = _pivot_dense(df, ["year"], "measure", "value")
+    pd.testing.assert_frame_equal(result, baseline_pivot(df, ["year"], "measure", "value"))
+
+
+def test_pivot_dense_declines_incomplete_grid(income_long):
+    assert _pivot_dense(income_long.iloc[1:], ["year", "region_code"], "measure", "value") is None
+
+
+def test_pivot_dense_declines_missing_keys(income_long):
+    df = income_long.copy()
+    df.loc[0, "region_code"] = None
+    assert _pivot_dense(df, ["year", "region_code"], "measure", "value") is None
+
+
+@pytest.mark.parametrize("dtype", ["Int64", "str"])
+def test_pivot_dense_declines_non_numpy_values(income_long, dtype):
+    df = income_long.astype({"value": dtype})
+    assert _pivot_dense(df, ["year", "region_code"], "measure", "value") is None
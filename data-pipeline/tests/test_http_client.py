@@ -0,0 +1,243 @@
+"""Tests for the shared HTTP helpers: rate limiters, header parsing and retries."""
+
+import httpx
+import pytest
+
+from data_pipeline.utils import http_client
+from data_pipeline.utils.http_client import (
+    HostRateGate,
+    SlidingWindowLimiter,
+    TokenBucket,
+    request_with_retry,
+)
+
+
+class FakeClock:
+    """Stands in for the ``time`` module; sleeping advances the clock."""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(http_client, "time", fake)
+    monkeypatch.setattr(http_client.random, "uniform", lambda a, b: 0.0)
+    return fake
+
+
+def mock_client(responses):
+    """Client whose transport replays ``responses`` and records each request."""
+    requests = []
+    replies = iter(responses)
+
+    def handler(request):
+        requests.append(request)
+        return next(replies)
+
+    return httpx.Client(transport=httpx.MockTransport(handler)), requests
+
+
+# TokenBucket
+
+def test_token_bucket_allows_a_burst_up_to_capacity(clock):
+    bucket = TokenBucket(capacity=3, refill_rate=1.0)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+
+def test_token_bucket_waits_for_refill_once_empty(clock):
+    bucket = TokenBucket(capacity=2, refill_rate=4.0)
+    bucket.acquire()
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(0.25)]
+
+
+def test_token_bucket_refills_with_idle_time_up_to_capacity(clock):
+    bucket = TokenBucket(capacity=2, refill_rate=1.0)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 100
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_token_bucket_penalize_slows_the_next_caller(clock):
+    bucket = TokenBucket(capacity=1, refill_rate=2.0)
+    bucket.penalize()
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_token_bucket_adopts_slower_header_rate_until_reset(clock):
+    bucket = TokenBucket(capacity=10, refill_rate=2.0)
+    bucket.update_from_headers(httpx.Headers({"X-RateLimit-Remaining": "5", "X-RateLimit-Reset": "10"}))
+    assert bucket.refill_rate == pytest.approx(0.5)
+    assert bucket.tokens == pytest.approx(5)
+
+    clock.now += 10
+    bucket.acquire()
+    assert bucket.refill_rate == pytest.approx(2.0)
+
+
+def test_token_bucket_header_rate_never_exceeds_base_rate(clock):
+    bucket = TokenBucket(capacity=10, refill_rate=2.0)
+    bucket.update_from_headers(httpx.Headers({"X-RateLimit-Remaining": "1000", "X-RateLimit-Reset": "1"}))
+    assert bucket.refill_rate == pytest.approx(2.0)
+
+
+def test_token_bucket_exhausted_quota_blocks_until_reset(clock):
+    bucket = TokenBucket(capacity=10, refill_rate=2.0)
+    bucket.update_from_headers(httpx.Headers({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "3"}))
+    bucket.acquire()
+    assert sum(clock.sleeps) >= 3
+
+
+def test_token_bucket_reads_epoch_reset(clock):
+    bucket = TokenBucket(capacity=10, refill_rate=2.0)
+    reset = clock.time() + 10
+    bucket.update_from_headers(httpx.Headers({"X-RateLimit-Remaining": "5", "X-RateLimit-Reset": str(reset)}))
+    assert bucket.refill_rate == pytest.approx(0.5)
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"X-RateLimit-Remaining": "5"},
+    {"X-RateLimit-Remaining": "abc", "X-RateLimit-Reset": "10"},
+    {"X-RateLimit-Remaining": "5", "X-RateLimit-Reset": "soon"},
+])
+def test_token_bucket_ignores_missing_or_malformed_headers(clock, headers):
+    bucket = TokenBucket(capacity=10, refill_rate=2.0)
+    bucket.update_from_headers(httpx.Headers(headers))
+    assert bucket.refill_rate == 2.0
+    assert bucket.tokens == 10
+
+
+# SlidingWindowLimiter
+
+def test_sliding_window_admits_at_most_max_requests_per_window(clock):
+    limiter = SlidingWindowLimiter(max_requests=30, window=10.0)
+    sent = []
+    for _ in range(90):
+        limiter.acquire()
+        sent.append(clock.now)
+
+    for i, start in enumerate(sent):
+        in_window = [t for t in sent[i:] if t < start + 10.0]
+        assert len(in_window) <= 30
+    assert sent[-1] - sent[0] == pytest.approx(20.0)
+
+
+# HostRateGate
+
+@pytest.mark.parametrize("policy, interval", [
+    ("10;w=1", 0.1),
+    ("10;w=2", 0.2),
+    ("5", 0.2),
+    ("20;w=10, 100;w=60", 0.5),
+])
+def test_host_rate_gate_spacing_from_policy(policy, interval):
+    gate = HostRateGate()
+    gate.update_from_headers("api.example", httpx.Headers({"RateLimit-Policy": policy}))
+    assert gate._intervals["api.example"] == pytest.approx(interval)
+
+
+@pytest.mark.parametrize("policy", ["10;w=abc", "abc;w=1", "10;w=0", "0;w=1", ""])
+def test_host_rate_gate_ignores_malformed_policy(policy):
+    gate = HostRateGate(min_interval=0.3)
+    gate.update_from_headers("api.example", httpx.Headers({"RateLimit-Policy": policy}))
+    assert "api.example" not in gate._intervals
+
+
+def test_host_rate_gate_spaces_requests_per_host(clock):
+    gate = HostRateGate(min_interval=0.5)
+    for _ in range(3):
+        with gate.slot("a.example"):
+            pass
+    with gate.slot("b.example"):
+        pass
+    assert clock.sleeps == [pytest.approx(0.5), pytest.approx(0.5)]
+
+
+# request_with_retry
+
+def test_retry_returns_first_non_retryable_response(clock):
+    client, requests = mock_client([httpx.Response(404)])
+    response = request_with_retry(client, "GET", "https://api.example/x")
+    assert response.status_code == 404
+    assert len(requests) == 1
+    assert clock.sleeps == []
+
+
+def test_retry_honors_retry_after(clock):
+    client, requests = mock_client([
+        httpx.Response(429, headers={"Retry-After": "7"}),
+        httpx.Response(200, json={"ok": True}),
+    ])
+    response = request_with_retry(client, "GET", "https://api.example/x")
+    assert response.status_code == 200
+    assert len(requests) == 2
+    assert clock.sleeps == [pytest.approx(7.0)]
+
+
+def test_retry_backs_off_exponentially_without_retry_after(clock):
+    client, requests = mock_client([
+        httpx.Response(503),
+        httpx.Response(502),
+        httpx.Response(429, headers={"Retry-After": "not-a-number"}),
+        httpx.Response(200),
+    ])
+    response = request_with_retry(client, "GET", "https://api.example/x")
+    assert response.status_code == 200
+    assert clock.sleeps == [pytest.approx(1.0), pytest.approx(2.0), pytest.approx(4.0)]
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_retry_gives_up_after_attempts_and_returns_last_response(clock, status):
+    client, requests = mock_client([httpx.Response(status)] * 3)
+    response = request_with_retry(client, "POST", "https://api.example/x", attempts=3, json={})
+    assert response.status_code == status
+    assert len(requests) == 3
+    # No sleep after the final attempt
+    assert len(clock.sleeps) == 2
+
+
+def test_retry_acquires_and_penalizes_the_bucket(clock):
+    client, requests = mock_client([httpx.Response(429, headers={"Retry-After": "0"}), httpx.Response(200)])
+    bucket = TokenBucket(capacity=5, refill_rate=1.0)
+    request_with_retry(client, "GET", "https://api.example/x", bucket=bucket)
+    # Two attempts plus one penalty token, with no time passing between them
+    assert bucket.tokens == pytest.approx(2.0)
+
+
+def test_retry_uses_sliding_window_limiter(clock):
+    client, requests = mock_client([httpx.Response(500), httpx.Response(200)])
+    limiter = SlidingWindowLimiter(max_requests=30, window=10.0)
+    response = request_with_retry(client, "GET", "https://api.example/x", bucket=limiter)
+    assert response.status_code == 200
+    # Both attempts and the penalty count against the window
+    assert len(limiter._sent) == 3
+
+
+def test_retry_tunes_gate_from_response_headers(clock):
+    client, requests = mock_client([httpx.Response(200, headers={"RateLimit-Policy": "4;w=1"})])
+    gate = HostRateGate()
+    request_with_retry(client, "GET", "https://api.example/x", gate=gate)
+    assert gate._intervals["api.example"] == pytest.approx(0.25)